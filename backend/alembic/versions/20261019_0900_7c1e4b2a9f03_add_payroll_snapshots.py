@@ -0,0 +1,39 @@
+"""add_payroll_snapshots
+
+Revision ID: 7c1e4b2a9f03
+Revises: 43641e22d5f3
+Create Date: 2026-10-19 09:00:12.418306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e4b2a9f03'
+down_revision: Union[str, None] = '43641e22d5f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('payroll_snapshots',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('bar', sa.String(length=50), nullable=True),
+    sa.Column('data_version', sa.String(length=64), nullable=False),
+    sa.Column('agents', sa.JSON(), nullable=False),
+    sa.Column('closed_by_id', sa.Integer(), nullable=True),
+    sa.Column('closed_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('invalidated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['closed_by_id'], ['app_users.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_payroll_snapshots_month_bar', 'payroll_snapshots', ['month', 'bar'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payroll_snapshots_month_bar', table_name='payroll_snapshots')
+    op.drop_table('payroll_snapshots')
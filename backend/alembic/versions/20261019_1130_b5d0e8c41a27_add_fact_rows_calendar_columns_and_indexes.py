@@ -0,0 +1,46 @@
+"""add_fact_rows_calendar_columns_and_indexes
+
+Revision ID: b5d0e8c41a27
+Revises: 7c1e4b2a9f03
+Create Date: 2026-10-19 11:30:41.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d0e8c41a27'
+down_revision: Union[str, None] = '7c1e4b2a9f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Stored generated columns so month/day filters can be indexed
+    op.add_column('fact_rows', sa.Column('year', sa.Integer(), sa.Computed('CAST(EXTRACT(YEAR FROM date) AS INTEGER)', persisted=True), nullable=False))
+    op.add_column('fact_rows', sa.Column('month', sa.Integer(), sa.Computed('CAST(EXTRACT(MONTH FROM date) AS INTEGER)', persisted=True), nullable=False))
+    op.add_column('fact_rows', sa.Column('day', sa.Date(), sa.Computed('CAST(date AS DATE)', persisted=True), nullable=False))
+    
+    # Filter/scan indexes:
+    # - (bar, date): bar + date range filters, payroll and KPI scans
+    # - (bar, agent_id_derived, date): agent filters ("BAR|ID" keys), agent leaderboards
+    # - (staff_id, date): staff lookups and history
+    # - (source_year, month): year/month filters without a date range
+    op.create_index('ix_fact_rows_bar_date', 'fact_rows', ['bar', 'date'])
+    op.create_index('ix_fact_rows_bar_agent_date', 'fact_rows', ['bar', 'agent_id_derived', 'date'])
+    op.create_index('ix_fact_rows_staff_date', 'fact_rows', ['staff_id', 'date'])
+    op.create_index('ix_fact_rows_source_year_month', 'fact_rows', ['source_year', 'month'])
+    op.execute('ANALYZE fact_rows')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_fact_rows_source_year_month', table_name='fact_rows')
+    op.drop_index('ix_fact_rows_staff_date', table_name='fact_rows')
+    op.drop_index('ix_fact_rows_bar_agent_date', table_name='fact_rows')
+    op.drop_index('ix_fact_rows_bar_date', table_name='fact_rows')
+    op.drop_column('fact_rows', 'day')
+    op.drop_column('fact_rows', 'month')
+    op.drop_column('fact_rows', 'year')
@@ -0,0 +1,31 @@
+"""add_fact_rows_keyset_indexes
+
+Revision ID: e2a97f6c3d10
+Revises: b5d0e8c41a27
+Create Date: 2026-10-19 14:15:03.557820
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a97f6c3d10'
+down_revision: Union[str, None] = 'b5d0e8c41a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Sortable columns of /rows; (column, id) matches the keyset ORDER BY
+SORT_COLUMNS = ['date', 'staff_id', 'profit', 'drinks', 'sale', 'total']
+
+
+def upgrade() -> None:
+    for col in SORT_COLUMNS:
+        op.create_index(f'ix_fact_rows_{col}_id', 'fact_rows', [col, 'id'])
+
+
+def downgrade() -> None:
+    for col in reversed(SORT_COLUMNS):
+        op.drop_index(f'ix_fact_rows_{col}_id', table_name='fact_rows')
@@ -0,0 +1,49 @@
+"""add_fact_row_change_tracking
+
+Revision ID: 9c3f61d2ab84
+Revises: e2a97f6c3d10
+Create Date: 2026-10-19 16:30:12.208431
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3f61d2ab84'
+down_revision: Union[str, None] = 'e2a97f6c3d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence('fact_row_change_seq')))
+    
+    # Volatile default: every existing row gets its own value when the column is added
+    op.add_column('fact_rows', sa.Column(
+        'change_seq', sa.BigInteger(),
+        server_default=sa.text("nextval('fact_row_change_seq')"),
+        nullable=False,
+    ))
+    op.create_index('ix_fact_rows_change_seq', 'fact_rows', ['change_seq'], unique=True)
+    op.create_index('ix_fact_rows_last_import_run_id', 'fact_rows', ['last_import_run_id'])
+    
+    op.create_table(
+        'fact_row_tombstones',
+        sa.Column('change_seq', sa.BigInteger(), nullable=False),
+        sa.Column('fact_row_id', sa.Integer(), nullable=False),
+        sa.Column('business_key', sa.String(length=64), nullable=False),
+        sa.Column('import_run_id', sa.Integer(), nullable=True),
+        sa.Column('deleted_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('change_seq'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('fact_row_tombstones')
+    op.drop_index('ix_fact_rows_last_import_run_id', table_name='fact_rows')
+    op.drop_index('ix_fact_rows_change_seq', table_name='fact_rows')
+    op.drop_column('fact_rows', 'change_seq')
+    op.execute(sa.schema.DropSequence(sa.Sequence('fact_row_change_seq')))
@@ -0,0 +1,69 @@
+"""add_daily_rollups
+
+Revision ID: 4be8d07a5c92
+Revises: 9c3f61d2ab84
+Create Date: 2026-10-19 17:10:41.617204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4be8d07a5c92'
+down_revision: Union[str, None] = '9c3f61d2ab84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MEASURES = ['profit', 'drinks', 'sale', 'total']
+
+
+def upgrade() -> None:
+    op.create_table(
+        'daily_rollups',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('source_year', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Integer(), nullable=False),
+        sa.Column('bar', sa.String(length=50), nullable=False),
+        sa.Column('agent_id_derived', sa.Integer(), nullable=True),
+        sa.Column('contract', sa.String(length=50), nullable=True),
+        sa.Column('position', sa.String(length=50), nullable=True),
+        sa.Column('rows', sa.Integer(), nullable=False),
+        sa.Column('staff_count', sa.Integer(), nullable=False),
+        *[
+            column
+            for name in MEASURES
+            for column in (
+                sa.Column(f'{name}_sum', sa.Numeric(precision=14, scale=2), nullable=False),
+                sa.Column(f'{name}_count', sa.Integer(), nullable=False),
+            )
+        ],
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_daily_rollups_date', 'daily_rollups', ['date'])
+    op.create_index('ix_daily_rollups_bar_date', 'daily_rollups', ['bar', 'date'])
+
+    # Backfill from existing fact rows
+    measure_columns = ', '.join(f'{name}_sum, {name}_count' for name in MEASURES)
+    measure_values = ', '.join(f'COALESCE(SUM({name}), 0), COUNT({name})' for name in MEASURES)
+    op.execute(f"""
+        INSERT INTO daily_rollups (
+            date, source_year, month, bar, agent_id_derived, contract, position,
+            rows, staff_count, {measure_columns}
+        )
+        SELECT
+            day, source_year, month, bar, agent_id_derived, contract, position,
+            COUNT(*), COUNT(DISTINCT staff_id), {measure_values}
+        FROM fact_rows
+        GROUP BY day, source_year, month, bar, agent_id_derived, contract, position
+    """)
+    op.execute("ANALYZE daily_rollups")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_daily_rollups_bar_date', table_name='daily_rollups')
+    op.drop_index('ix_daily_rollups_date', table_name='daily_rollups')
+    op.drop_table('daily_rollups')
@@ -0,0 +1,59 @@
+"""add_daily_staff_sketches
+
+Revision ID: 5d3a9e7b1c46
+Revises: 4be8d07a5c92
+Create Date: 2026-10-19 18:00:12.408391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d3a9e7b1c46'
+down_revision: Union[str, None] = '4be8d07a5c92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'daily_staff_sketches',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('source_year', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Integer(), nullable=False),
+        sa.Column('bar', sa.String(length=50), nullable=False),
+        sa.Column('agent_id_derived', sa.Integer(), nullable=True),
+        sa.Column('registers', sa.ARRAY(sa.Integer()), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_daily_staff_sketches_date', 'daily_staff_sketches', ['date'])
+    op.create_index(
+        'ix_daily_staff_sketches_bar_agent_date',
+        'daily_staff_sketches',
+        ['bar', 'agent_id_derived', 'date'],
+    )
+
+    # Backfill from existing fact rows (same entries as services.hll.sketch_entry)
+    op.execute("""
+        INSERT INTO daily_staff_sketches (date, source_year, month, bar, agent_id_derived, registers)
+        SELECT
+            day, source_year, month, bar, agent_id_derived,
+            array_agg(DISTINCT (
+                (h & 1023) << 6
+                | CASE WHEN h >> 10 = 0 THEN 55
+                       ELSE round(ln(((h >> 10) & -(h >> 10))::float8) / ln(2))::int + 1 END
+            )::int)
+        FROM (SELECT *, hashtextextended(staff_id, 0) AS h FROM fact_rows) AS hashed
+        GROUP BY day, source_year, month, bar, agent_id_derived
+    """)
+    op.execute("ANALYZE daily_staff_sketches")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_daily_staff_sketches_bar_agent_date', table_name='daily_staff_sketches')
+    op.drop_index('ix_daily_staff_sketches_date', table_name='daily_staff_sketches')
+    op.drop_table('daily_staff_sketches')
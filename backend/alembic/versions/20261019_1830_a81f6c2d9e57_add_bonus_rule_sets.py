@@ -0,0 +1,55 @@
+"""add_bonus_rule_sets
+
+Revision ID: a81f6c2d9e57
+Revises: 5d3a9e7b1c46
+Create Date: 2026-10-19 18:30:47.112930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a81f6c2d9e57'
+down_revision: Union[str, None] = '5d3a9e7b1c46'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bonus_rule_sets = op.create_table(
+        'bonus_rule_sets',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('a_min_staff', sa.Integer(), nullable=False),
+        sa.Column('a_per_staff', sa.Integer(), nullable=False),
+        sa.Column('b_min_profit', sa.Integer(), nullable=False),
+        sa.Column('b_per_staff', sa.Integer(), nullable=False),
+        sa.Column('c_tiers', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+
+    # The rules payroll used so far, as the active set
+    op.bulk_insert(bonus_rule_sets, [{
+        'name': 'default',
+        'is_active': True,
+        'a_min_staff': 10,
+        'a_per_staff': 50,
+        'b_min_profit': 1500,
+        'b_per_staff': 50,
+        'c_tiers': [
+            {'min_avg_staff': 40, 'amount': 40000},
+            {'min_avg_staff': 30, 'amount': 30000},
+            {'min_avg_staff': 20, 'amount': 20000},
+        ],
+    }])
+
+
+def downgrade() -> None:
+    op.drop_table('bonus_rule_sets')
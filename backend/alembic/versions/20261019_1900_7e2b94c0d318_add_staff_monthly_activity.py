@@ -0,0 +1,60 @@
+"""add_staff_monthly_activity
+
+Revision ID: 7e2b94c0d318
+Revises: a81f6c2d9e57
+Create Date: 2026-10-19 19:00:26.530174
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e2b94c0d318'
+down_revision: Union[str, None] = 'a81f6c2d9e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'staff_monthly_activity',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('month_start', sa.Date(), nullable=False),
+        sa.Column('bar', sa.String(length=50), nullable=False),
+        sa.Column('staff_id', sa.String(length=100), nullable=False),
+        sa.Column('agent_id_derived', sa.Integer(), nullable=True),
+        sa.Column('first_seen', sa.Date(), nullable=False),
+        sa.Column('last_seen', sa.Date(), nullable=False),
+        sa.Column('days', sa.Integer(), nullable=False),
+        sa.Column('profit_sum', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_staff_monthly_activity_bar_staff_month',
+        'staff_monthly_activity',
+        ['bar', 'staff_id', 'month_start'],
+        unique=True,
+    )
+    op.create_index('ix_staff_monthly_activity_month_start', 'staff_monthly_activity', ['month_start'])
+
+    # Backfill from existing fact rows
+    op.execute("""
+        INSERT INTO staff_monthly_activity (
+            month_start, bar, staff_id, agent_id_derived, first_seen, last_seen, days, profit_sum
+        )
+        SELECT
+            CAST(date_trunc('month', day) AS DATE), bar, staff_id, MAX(agent_id_derived),
+            MIN(day), MAX(day), COUNT(DISTINCT day), COALESCE(SUM(profit), 0)
+        FROM fact_rows
+        GROUP BY CAST(date_trunc('month', day) AS DATE), bar, staff_id
+    """)
+    op.execute("ANALYZE staff_monthly_activity")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_staff_monthly_activity_month_start', table_name='staff_monthly_activity')
+    op.drop_index('ix_staff_monthly_activity_bar_staff_month', table_name='staff_monthly_activity')
+    op.drop_table('staff_monthly_activity')
@@ -0,0 +1,59 @@
+"""add_staff_profile_measures
+
+Revision ID: b4d17f3e6a20
+Revises: 7e2b94c0d318
+Create Date: 2026-10-19 19:30:08.246617
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d17f3e6a20'
+down_revision: Union[str, None] = '7e2b94c0d318'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'staff_monthly_activity',
+        sa.Column('drinks_sum', sa.Numeric(precision=14, scale=2), nullable=False, server_default='0'),
+    )
+    op.add_column(
+        'staff_monthly_activity',
+        sa.Column('mismatch_rows', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.create_index(
+        'ix_staff_monthly_activity_staff_month',
+        'staff_monthly_activity',
+        ['staff_id', 'month_start'],
+    )
+
+    # Backfill the new measures from existing fact rows
+    op.execute("""
+        UPDATE staff_monthly_activity AS activity
+        SET drinks_sum = measures.drinks_sum, mismatch_rows = measures.mismatch_rows
+        FROM (
+            SELECT
+                CAST(date_trunc('month', day) AS DATE) AS month_start, bar, staff_id,
+                COALESCE(SUM(drinks), 0) AS drinks_sum,
+                COUNT(*) FILTER (WHERE agent_mismatch) AS mismatch_rows
+            FROM fact_rows
+            GROUP BY CAST(date_trunc('month', day) AS DATE), bar, staff_id
+        ) AS measures
+        WHERE activity.month_start = measures.month_start
+          AND activity.bar = measures.bar
+          AND activity.staff_id = measures.staff_id
+    """)
+    op.alter_column('staff_monthly_activity', 'drinks_sum', server_default=None)
+    op.alter_column('staff_monthly_activity', 'mismatch_rows', server_default=None)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_staff_monthly_activity_staff_month', table_name='staff_monthly_activity')
+    op.drop_column('staff_monthly_activity', 'mismatch_rows')
+    op.drop_column('staff_monthly_activity', 'drinks_sum')
@@ -0,0 +1,41 @@
+"""add_staff_id_trigram_index
+
+Revision ID: c6e8a1f49b73
+Revises: b4d17f3e6a20
+Create Date: 2026-10-19 20:00:51.903612
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6e8a1f49b73'
+down_revision: Union[str, None] = 'b4d17f3e6a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Built without locking fact_rows against writes; CONCURRENTLY cannot run in a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_fact_rows_staff_id_trgm',
+            'fact_rows',
+            ['staff_id'],
+            postgresql_using='gin',
+            postgresql_ops={'staff_id': 'gin_trgm_ops'},
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_fact_rows_staff_id_trgm',
+            table_name='fact_rows',
+            postgresql_concurrently=True,
+        )
+    # The extension is left installed: other objects may depend on it
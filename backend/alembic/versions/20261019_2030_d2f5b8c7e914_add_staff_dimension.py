@@ -0,0 +1,58 @@
+"""add_staff_dimension
+
+Revision ID: d2f5b8c7e914
+Revises: c6e8a1f49b73
+Create Date: 2026-10-19 20:30:17.664025
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f5b8c7e914'
+down_revision: Union[str, None] = 'c6e8a1f49b73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'staff',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('staff_id', sa.String(length=100), nullable=False),
+        sa.Column('staff_num_prefix', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('staff_id'),
+    )
+
+    # Backfill the dimension, then key existing fact rows
+    op.execute("""
+        INSERT INTO staff (staff_id, staff_num_prefix)
+        SELECT staff_id, MIN(staff_num_prefix)
+        FROM fact_rows
+        GROUP BY staff_id
+        ORDER BY staff_id
+    """)
+    op.add_column('fact_rows', sa.Column('staff_key', sa.Integer(), nullable=True))
+    op.execute("""
+        UPDATE fact_rows
+        SET staff_key = staff.id
+        FROM staff
+        WHERE staff.staff_id = fact_rows.staff_id
+    """)
+    op.alter_column('fact_rows', 'staff_key', nullable=False)
+    op.create_foreign_key('fact_rows_staff_key_fkey', 'fact_rows', 'staff', ['staff_key'], ['id'])
+    op.create_index('ix_fact_rows_staff_key_date', 'fact_rows', ['staff_key', 'date'])
+    op.execute("ANALYZE staff")
+    op.execute("ANALYZE fact_rows")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_fact_rows_staff_key_date', table_name='fact_rows')
+    op.drop_constraint('fact_rows_staff_key_fkey', 'fact_rows', type_='foreignkey')
+    op.drop_column('fact_rows', 'staff_key')
+    op.drop_table('staff')
@@ -0,0 +1,41 @@
+"""unique_payroll_snapshot_scope
+
+Revision ID: e7a3c5d9b162
+Revises: d2f5b8c7e914
+Create Date: 2026-10-19 21:00:34.871240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3c5d9b162'
+down_revision: Union[str, None] = 'd2f5b8c7e914'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep the latest snapshot of any scope closed twice concurrently
+    op.execute("""
+        DELETE FROM payroll_snapshots AS older
+        USING payroll_snapshots AS newer
+        WHERE older.month = newer.month
+          AND coalesce(older.bar, '') = coalesce(newer.bar, '')
+          AND older.id < newer.id
+    """)
+    op.drop_index('ix_payroll_snapshots_month_bar', table_name='payroll_snapshots')
+    op.create_index(
+        'ix_payroll_snapshots_month_bar',
+        'payroll_snapshots',
+        ['month', sa.text("coalesce(bar, '')")],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payroll_snapshots_month_bar', table_name='payroll_snapshots')
+    op.create_index('ix_payroll_snapshots_month_bar', 'payroll_snapshots', ['month', 'bar'])
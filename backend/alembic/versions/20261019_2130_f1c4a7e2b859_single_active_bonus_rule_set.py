@@ -0,0 +1,40 @@
+"""single_active_bonus_rule_set
+
+Revision ID: f1c4a7e2b859
+Revises: e7a3c5d9b162
+Create Date: 2026-10-19 21:30:12.406518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c4a7e2b859'
+down_revision: Union[str, None] = 'e7a3c5d9b162'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep the most recently updated set active if several are
+    op.execute("""
+        UPDATE bonus_rule_sets SET is_active = false
+        WHERE is_active AND id <> (
+            SELECT id FROM bonus_rule_sets WHERE is_active
+            ORDER BY updated_at DESC, id DESC LIMIT 1
+        )
+    """)
+    op.create_index(
+        'ix_bonus_rule_sets_single_active',
+        'bonus_rule_sets',
+        [sa.text('(true)')],
+        unique=True,
+        postgresql_where=sa.text('is_active'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_bonus_rule_sets_single_active', table_name='bonus_rule_sets')
@@ -1,6 +1,6 @@
 """API module exports."""
 from app.api.deps import CurrentAdmin, CurrentUser, DbSession, get_current_admin, get_current_user
-from app.api.routes import auth_router, import_router, rows_router, settings_router, users_router, analytics_router
+from app.api.routes import auth_router, import_router, rows_router, settings_router, users_router, analytics_router, search_router
 
 __all__ = [
     "get_current_user",
@@ -14,4 +14,5 @@ __all__ = [
     "settings_router",
     "users_router",
     "analytics_router",
+    "search_router",
 ]
@@ -0,0 +1,84 @@
+"""
+Conditional GET support for read endpoints.
+
+Responses are tagged with a weak ETag derived from the data version and the
+request URL, plus the current date for endpoints that depend on it. A request whose If-None-Match matches gets 304 Not Modified
+before routing, so no query runs. Only requests carrying a valid access
+token can get a 304; anything else goes through normal routing and auth.
+"""
+import hashlib
+from datetime import date
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import cookie_parser
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.security import decode_token
+from app.services.data_version import current_data_version
+
+# Read endpoints whose payload depends only on the data version and the URL
+CACHEABLE_PREFIXES = ("/api/rows", "/api/analytics", "/api/import")
+# ...and also on today's date (days remaining, 31-day active pools)
+DATE_DEPENDENT_PREFIXES = ("/api/analytics/payroll",)
+
+
+def _has_valid_token(headers: Headers) -> bool:
+    """Same token lookup as get_current_user (cookie, then Bearer), without the user query."""
+    token = cookie_parser(headers.get("cookie", "")).get("access_token")
+    authorization = headers.get("authorization", "")
+    if not token and authorization.startswith("Bearer "):
+        token = authorization.split(" ", 1)[1]
+    payload = decode_token(token) if token else None
+    return bool(payload and payload.get("type") == "access")
+
+
+def make_etag(version: str, path: str, query_string: bytes) -> str:
+    key = path.encode("utf-8") + b"?" + query_string
+    if path.startswith(DATE_DEPENDENT_PREFIXES):
+        key += b"@" + date.today().isoformat().encode("ascii")
+    digest = hashlib.sha256(key).hexdigest()[:16]
+    return f'W/"{version}-{digest}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: ignore W/ prefixes
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+class ConditionalGetMiddleware:
+    """Add ETags to cacheable GET responses and answer If-None-Match with 304."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not scope["path"].startswith(CACHEABLE_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+        
+        version = await current_data_version()
+        etag = make_etag(version, scope["path"], scope["query_string"])
+        headers = Headers(scope=scope)
+        
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag) and _has_valid_token(headers):
+            response = Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+            await response(scope, receive, send)
+            return
+        
+        async def send_with_etag(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                response_headers = MutableHeaders(scope=message)
+                response_headers["ETag"] = etag
+                response_headers["Cache-Control"] = "private, no-cache"
+            await send(message)
+        
+        await self.app(scope, receive, send_with_etag)
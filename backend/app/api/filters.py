@@ -0,0 +1,154 @@
+"""
+Shared fact-row filters for table, KPI and analytics endpoints.
+"""
+from datetime import date, datetime, timedelta
+from typing import Annotated
+
+from fastapi import Depends, Query
+from sqlalchemy import and_, or_
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models import FactRow
+
+
+def contains_pattern(term: str) -> str:
+    """ILIKE pattern matching `term` as a literal substring (escape character: backslash)."""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def staff_search_condition(column, term: str) -> ColumnElement[bool]:
+    """
+    Substring search on a staff_id column. Kept as a plain ILIKE on the
+    column so the pg_trgm GIN index on fact_rows.staff_id can serve it
+    (terms shorter than 3 characters have no trigrams and scan).
+    """
+    return column.ilike(contains_pattern(term), escape="\\")
+
+
+def parse_agent_keys(keys: list[str], model=FactRow) -> list[ColumnElement[bool]]:
+    """
+    Parse composite agent keys "BAR|ID" into conditions.
+    "BAR|0" and "BAR|NULL" select the house agent (no derived agent).
+    Invalid keys are skipped.
+    """
+    conditions = []
+    for key in keys:
+        if "|" not in key:
+            continue
+        try:
+            target_bar, target_id_str = key.split("|")
+            if target_id_str == "0" or target_id_str == "NULL":
+                conditions.append(and_(
+                    model.bar == target_bar,
+                    model.agent_id_derived.is_(None)
+                ))
+            else:
+                conditions.append(and_(
+                    model.bar == target_bar,
+                    model.agent_id_derived == int(target_id_str)
+                ))
+        except ValueError:
+            continue
+    return conditions
+
+
+class RowFilters:
+    """
+    Filter query parameters shared by /rows endpoints.
+
+    Date range (start_date + end_date) takes priority over year/month.
+    Conditions are built once per request and reused by every query.
+    They can also be built against a rollup model with the same column
+    names (see supports()).
+    """
+
+    def __init__(
+        self,
+        bar: list[str] | None = Query(None),
+        year: list[int] | None = Query(None),
+        month: list[int] | None = Query(None),
+        contract: list[str] | None = Query(None),
+        agent: list[str] | None = Query(None),
+        start_date: str | None = None,
+        end_date: str | None = None,
+        staff_search: str | None = None,
+    ):
+        self.bar = bar
+        self.year = year
+        self.month = month
+        self.contract = contract
+        self.agent = agent
+        self.staff_search = staff_search
+        self.date_range = self._parse_range(start_date, end_date)
+        self._conditions = self._build(FactRow)
+    
+    def cache_key(self) -> tuple:
+        """Hashable, order-insensitive identity of the filter values."""
+        return (
+            tuple(sorted(self.bar or ())),
+            tuple(sorted(self.year or ())),
+            tuple(sorted(self.month or ())),
+            tuple(sorted(self.contract or ())),
+            tuple(sorted(self.agent or ())),
+            self.date_range,
+            self.staff_search,
+        )
+
+    @staticmethod
+    def _parse_range(start_date: str | None, end_date: str | None) -> tuple[date, date] | None:
+        if not (start_date and end_date):
+            return None
+        try:
+            return (
+                datetime.strptime(start_date, '%Y-%m-%d').date(),
+                datetime.strptime(end_date, '%Y-%m-%d').date(),
+            )
+        except ValueError:
+            return None
+
+    def _build(self, model) -> dict[str, list[ColumnElement[bool]]]:
+        """Conditions keyed by filter name."""
+        conditions: dict[str, list[ColumnElement[bool]]] = {}
+        if self.bar:
+            conditions["bar"] = [model.bar.in_(self.bar)]
+        if self.date_range:
+            s_date, e_date = self.date_range
+            conditions["date"] = [model.date >= s_date, model.date < e_date + timedelta(days=1)]
+        else:
+            if self.year:
+                conditions["year"] = [model.source_year.in_(self.year)]
+            if self.month:
+                conditions["month"] = [model.month.in_(self.month)]
+        if self.contract:
+            conditions["contract"] = [model.contract.in_(self.contract)]
+        if self.agent:
+            agent_conditions = parse_agent_keys(self.agent, model)
+            if agent_conditions:
+                conditions["agent"] = [or_(*agent_conditions)]
+        if self.staff_search:
+            conditions["staff_search"] = [staff_search_condition(model.staff_id, self.staff_search)]
+        return conditions
+
+    def supports(self, model) -> bool:
+        """Whether every active filter can be applied to `model` (rollups have no staff_id)."""
+        required = {"staff_id": self.staff_search, "contract": self.contract}
+        return all(hasattr(model, column) for column, active in required.items() if active)
+
+    def conditions(self, exclude: tuple[str, ...] = (), model=None) -> list[ColumnElement[bool]]:
+        """All conditions, optionally without the named filters or against another model."""
+        built = self._conditions if model is None else self._build(model)
+        return [
+            condition
+            for name, group in built.items()
+            if name not in exclude
+            for condition in group
+        ]
+
+    def apply(self, query, exclude: tuple[str, ...] = (), model=None):
+        """Apply the filters to a select."""
+        conditions = self.conditions(exclude, model)
+        return query.where(*conditions) if conditions else query
+
+
+RowFiltersDep = Annotated[RowFilters, Depends()]
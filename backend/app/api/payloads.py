@@ -0,0 +1,55 @@
+"""
+Compact payload shapes for row endpoints: projected records and columnar.
+Values are left as DB types; FastJSONResponse renders them.
+"""
+from typing import Any, Iterable, Sequence
+
+from fastapi import HTTPException, status
+
+from app.schemas import FactRowResponse
+
+# Fields a client may project (same names as FactRowResponse)
+ROW_FIELDS = list(FactRowResponse.model_fields)
+
+# Low-cardinality text columns sent as {"values": [...], "codes": [...]} in columnar payloads
+DICTIONARY_FIELDS = {"bar", "contract", "position", "agent_label"}
+
+
+def parse_fields(fields: list[str] | None) -> list[str] | None:
+    """
+    Validate a projection. Accepts repeated and/or comma-separated values.
+    Returns None when no projection was requested.
+    """
+    if not fields:
+        return None
+    names = [name.strip() for value in fields for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in ROW_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}",
+        )
+    # Keep schema order, drop duplicates
+    return [name for name in ROW_FIELDS if name in names]
+
+
+def to_records(rows: Iterable[Any], fields: Sequence[str]) -> list[dict[str, Any]]:
+    """Row objects -> list of {field: value} with only the projected fields."""
+    return [{name: getattr(row, name) for name in fields} for row in rows]
+
+
+def to_columnar(rows: Sequence[Any], fields: Sequence[str]) -> dict[str, Any]:
+    """
+    Row objects -> one array per field.
+    Fields in DICTIONARY_FIELDS are dictionary-encoded.
+    """
+    columns: dict[str, Any] = {}
+    for name in fields:
+        values = [getattr(row, name) for row in rows]
+        if name in DICTIONARY_FIELDS:
+            dictionary: dict[Any, int] = {}
+            codes = [dictionary.setdefault(v, len(dictionary)) for v in values]
+            columns[name] = {"values": list(dictionary), "codes": codes}
+        else:
+            columns[name] = values
+    return {"count": len(rows), "columns": columns}
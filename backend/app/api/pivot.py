@@ -0,0 +1,193 @@
+"""
+Pivot query compiler for /analytics/pivot.
+
+Dimensions and measures come from fixed whitelists and compile to one
+GROUP BY (or CUBE) statement. Requests whose grain the daily rollups can
+answer (no staff dimension, no distinct counts, no staff search) read
+daily_rollups instead of fact_rows.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from itertools import combinations
+from typing import Any, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import Date, Integer, cast, distinct, func, literal_column, select, tuple_
+from sqlalchemy.sql import Select
+
+from app.api.filters import RowFilters
+from app.models import DailyRollup, FactRow
+
+DIMENSIONS = ["bar", "agent", "staff", "year", "month", "week", "contract", "position"]
+AGGREGATES = ["sum", "avg", "count", "distinct"]
+MEASURE_FIELDS = ["profit", "drinks", "sale", "total"]
+# Extra measures besides aggregate:field over MEASURE_FIELDS
+SPECIAL_MEASURES = ["count:rows", "distinct:staff"]
+
+MAX_DIMENSIONS = 4
+
+# Need row-level data: not answerable from daily_rollups
+FACT_ONLY_DIMENSIONS = {"staff"}
+FACT_ONLY_AGGREGATES = {"distinct"}
+
+
+@dataclass
+class Measure:
+    aggregate: str
+    field: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.aggregate}_{self.field}"
+
+
+def _split(values: list[str] | None) -> list[str]:
+    return [name.strip() for value in values or [] for name in value.split(",") if name.strip()]
+
+
+def parse_dimensions(values: list[str] | None) -> list[str]:
+    names = list(dict.fromkeys(_split(values)))
+    unknown = [name for name in names if name not in DIMENSIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown dimensions: {', '.join(unknown)}",
+        )
+    if len(names) > MAX_DIMENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_DIMENSIONS} dimensions",
+        )
+    return names
+
+
+def parse_measures(values: list[str] | None) -> list[Measure]:
+    """Measures as "aggregate:field", e.g. sum:profit, avg:drinks, count:rows."""
+    specs = list(dict.fromkeys(_split(values))) or ["sum:profit"]
+    measures = []
+    for spec in specs:
+        aggregate, _, field = spec.partition(":")
+        if spec not in SPECIAL_MEASURES and (aggregate not in AGGREGATES or field not in MEASURE_FIELDS):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown measure '{spec}'",
+            )
+        measures.append(Measure(aggregate, field))
+    return measures
+
+
+def can_use_rollup(dimensions: Sequence[str], measures: Sequence[Measure], filters: RowFilters) -> bool:
+    return (
+        not FACT_ONLY_DIMENSIONS.intersection(dimensions)
+        and not any(m.aggregate in FACT_ONLY_AGGREGATES for m in measures)
+        and filters.supports(DailyRollup)
+    )
+
+
+def truncate_date(unit: str, column):
+    # Literal unit so SELECT and GROUP BY compile to the same expression
+    return cast(func.date_trunc(literal_column(f"'{unit}'"), column), Date)
+
+
+def _dimension_columns(name: str, model) -> list:
+    """Columns of a dimension (agent is the (bar, agent_id) pair)."""
+    if name == "agent":
+        return [model.bar.label("agent_bar"), model.agent_id_derived.label("agent_id")]
+    if name == "staff":
+        return [model.staff_id.label("staff")]
+    if name == "year":
+        if model is FactRow:
+            return [FactRow.year.label("year")]
+        return [cast(func.extract("year", model.date), Integer).label("year")]
+    if name in ("month", "week"):
+        return [truncate_date(name, model.date).label(name)]
+    return [getattr(model, name).label(name)]
+
+
+def _measure_column(measure: Measure, use_rollup: bool):
+    if use_rollup:
+        if measure.field == "rows":
+            return func.sum(DailyRollup.rows)
+        total = func.sum(getattr(DailyRollup, f"{measure.field}_sum"))
+        count = func.sum(getattr(DailyRollup, f"{measure.field}_count"))
+        if measure.aggregate == "sum":
+            return total
+        if measure.aggregate == "avg":
+            return total / func.nullif(count, 0)
+        return count
+    if measure.field == "rows":
+        return func.count()
+    column = FactRow.staff_key if measure.field == "staff" else getattr(FactRow, measure.field)
+    if measure.aggregate == "distinct":
+        return func.count(distinct(column))
+    return getattr(func, measure.aggregate)(column)
+
+
+def _cube_sets(dimension_exprs: list[list]) -> list:
+    """
+    Grouping sets of CUBE(dimensions), without duplicates: bar and agent
+    share the bar column, so two subsets can group by the same columns.
+    """
+    sets = {}
+    for size in range(len(dimension_exprs), -1, -1):
+        for subset in combinations(dimension_exprs, size):
+            exprs = {str(expr): expr for exprs in subset for expr in exprs}
+            sets.setdefault(frozenset(exprs), list(exprs.values()))
+    return [tuple_(*exprs) for exprs in sets.values()]
+
+
+def build_pivot_query(
+    dimensions: Sequence[str],
+    measures: Sequence[Measure],
+    filters: RowFilters,
+    cube: bool,
+    use_rollup: bool,
+) -> Select:
+    """
+    One GROUP BY statement over fact_rows or daily_rollups; with `cube`,
+    GROUP BY GROUPING SETS listing every subset of the dimensions.
+    """
+    model = DailyRollup if use_rollup else FactRow
+    columns = {name: _dimension_columns(name, model) for name in dimensions}
+    group_exprs = {name: [col.element for col in cols] for name, cols in columns.items()}
+
+    selected = [col for cols in columns.values() for col in cols]
+    selected += [_measure_column(m, use_rollup).label(m.name) for m in measures]
+    if cube and dimensions:
+        # One expression per dimension; agent_id stands for the (bar, agent_id) pair
+        selected.append(func.grouping(*(exprs[-1] for exprs in group_exprs.values())).label("grouping"))
+
+    query = filters.apply(select(*selected), model=model)
+    if dimensions:
+        if cube:
+            query = query.group_by(func.grouping_sets(*_cube_sets(list(group_exprs.values()))))
+        else:
+            query = query.group_by(*(expr for exprs in group_exprs.values() for expr in exprs))
+        query = query.order_by(
+            *(expr.asc().nulls_last() for exprs in group_exprs.values() for expr in exprs),
+            *([literal_column("grouping")] if cube else []),
+        )
+    return query
+
+
+def pivot_records(rows: Sequence[Any], dimensions: Sequence[str], measures: Sequence[Measure], cube: bool) -> list[dict[str, Any]]:
+    """Result rows -> records keyed by dimension and measure names."""
+    records = []
+    for row in rows:
+        # Bit set (first dimension = highest) when the row totals over that dimension
+        grouping = row.grouping if cube and dimensions else 0
+        record: dict[str, Any] = {}
+        for i, name in enumerate(dimensions):
+            if grouping & (1 << (len(dimensions) - 1 - i)):
+                record[name] = None
+            elif name == "agent":
+                record[name] = f"{row.agent_bar}|{row.agent_id or 'NULL'}"
+            else:
+                record[name] = getattr(row, name)
+        for measure in measures:
+            value = getattr(row, measure.name)
+            record[measure.name] = float(value) if isinstance(value, Decimal) else value
+        if cube and dimensions:
+            record["grouping"] = grouping
+        records.append(record)
+    return records
@@ -0,0 +1,29 @@
+"""
+Fast JSON response for read endpoints.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson.
+
+    Endpoints return plain row mappings through it, skipping ORM loading and
+    response-model validation; keep `response_model` on the route so the
+    OpenAPI schema still documents the payload. Decimals render as floats and
+    datetimes as ISO 8601, matching the Pydantic schemas.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
@@ -1,16 +1,49 @@
 from datetime import date, timedelta, datetime
-from typing import List, Optional, Literal
+from typing import Any, List, Optional, Literal
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import func, select, distinct, desc, and_, case
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import ARRAY, Date, Float, Integer, cast, type_coerce, column, func, literal_column, select, distinct, desc, and_, or_, case, values
+from sqlalchemy.dialects.postgresql import array
 from sqlalchemy.ext.asyncio import AsyncSession
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-from app.api.deps import get_db
-from app.models.base import FactRow, AgentRangeRule
+from app.api.deps import CurrentAdmin, CurrentUser, get_db
+from app.api.filters import RowFiltersDep, parse_agent_keys, staff_search_condition
+from app.api.pivot import (
+    build_pivot_query,
+    can_use_rollup,
+    parse_dimensions,
+    parse_measures,
+    pivot_records,
+    truncate_date,
+)
+from app.models.base import FactRow, AgentRangeRule, BonusRuleSet, DailyRollup, DailyStaffSketch, Staff, StaffMonthlyActivity
+from app.schemas import BonusRuleSetBase, FactRowResponse
+from app.services.analytics_engine import get_engine
+from app.services.bonus_rules import BonusRules, fetch_agent_days, get_active_rules, simulate
+from app.services.data_version import get_data_version, invalidate_data_version
+from app.services.hll import RELATIVE_ERROR, approx_distinct_staff
+from app.services.payroll_snapshots import get_snapshot, save_snapshot
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
+MAX_SERIES_PERIODS = 36
+MAX_SIMULATED_RULE_SETS = 20
+MAX_TIMESERIES_POINTS = 2000
+MAX_RETENTION_MONTHS = 60
+
+# Time-series metrics; "staff" (distinct staff per bucket) needs fact rows
+TIMESERIES_METRICS = ["profit", "drinks", "sale", "rows", "staff"]
+
+# /compare entity keys per grouping
+COMPARE_KEYS = {
+    "staff": ("bar", "staff_key"),
+    "agent": ("bar", "agent_id_derived"),
+    "bar": ("bar",),
+}
+# Row filters replaced by the compared periods
+PERIOD_FILTERS = ("date", "year", "month")
+
 # --- Schemas ---
 
 class DailyStat(BaseModel):
@@ -49,6 +82,11 @@ class PayrollResponse(BaseModel):
     agents: List[AgentPayroll]
     period_start: date
     period_end: date
+    # Set when served from a closed-month snapshot
+    closed_at: Optional[datetime] = None
+    data_version: Optional[str] = None
+    # Relative standard error when pools are sketch estimates
+    pool_error: Optional[float] = None
 
 class LeaderboardEntry(BaseModel):
     rank: int
@@ -66,6 +104,258 @@ class LeaderboardEntry(BaseModel):
 class LeaderboardResponse(BaseModel):
     entries: List[LeaderboardEntry]
 
+class PayrollPeriod(BaseModel):
+    period_start: date
+    period_end: date
+    agents: List[AgentPayroll]
+
+class PayrollSeriesResponse(BaseModel):
+    periods: List[PayrollPeriod]
+
+class PayrollSimulationRequest(BaseModel):
+    year: int = Field(..., ge=2000, le=2100)
+    bar: Optional[str] = None
+    rule_set_ids: List[int] = []  # Saved rule sets
+    rule_sets: List[BonusRuleSetBase] = []  # Unsaved candidates
+
+class SimulatedRuleSet(BaseModel):
+    name: str
+    bonus_a: int
+    bonus_b: int
+    bonus_c: int
+    total: int
+
+class SimulatedAgentCost(BaseModel):
+    agent_id: str  # "BAR|ID"
+    agent_name: str
+    bar: str
+    totals: List[int]  # Total cost per rule set, in rule_sets order
+
+class PayrollSimulationResponse(BaseModel):
+    period_start: date
+    period_end: date
+    rule_sets: List[SimulatedRuleSet]  # Active rules first
+    agents: List[SimulatedAgentCost]
+
+class TimeseriesResponse(BaseModel):
+    bucket: Literal["day", "week", "month"]
+    source: Literal["rollup", "facts"]
+    buckets: List[date]  # Bucket start dates, gap-filled
+    series: dict[str, List[float]]  # Metric -> one value per bucket
+
+class DistributionStats(BaseModel):
+    min: float
+    max: float
+    mean: float
+    median: float
+    p10: float
+    p90: float
+
+class DistributionEntry(BaseModel):
+    id: str  # staff_id or agent_key
+    name: str
+    bar: Optional[str] = None
+    agent_id: Optional[int] = None
+    days: int
+    profit: DistributionStats  # Daily profit
+    drinks: DistributionStats  # Daily drinks
+
+class DistributionResponse(BaseModel):
+    entries: List[DistributionEntry]
+
+class CompareMetrics(BaseModel):
+    profit: float
+    drinks: float
+    days: int
+    rentability: float  # profit/day
+
+class CompareEntry(BaseModel):
+    id: str  # staff_id, "BAR|ID" or bar
+    name: str
+    bar: str
+    agent_id: Optional[int] = None
+    current: Optional[CompareMetrics]  # None when absent from the period
+    previous: Optional[CompareMetrics]
+    delta: CompareMetrics  # current - previous, absent side counted as zero
+
+class CompareResponse(BaseModel):
+    group_by: Literal["staff", "agent", "bar"]
+    source: Literal["rollup", "facts"]
+    current_start: date
+    current_end: date
+    previous_start: date
+    previous_end: date
+    entries: List[CompareEntry]
+
+class RetentionPoint(BaseModel):
+    month: date
+    active: int
+    new: int  # First month ever in the bar
+    returning: int  # Back after at least one month away
+    retained: int  # Also active the month before
+    churned: int  # Active the month before, not this month
+
+class RetentionCohort(BaseModel):
+    cohort: date  # First month worked
+    size: int
+    active: List[int]  # Cohort members active 0, 1, 2... months later
+
+class RetentionGroup(BaseModel):
+    key: str  # "ALL", bar or "BAR|ID"
+    bar: Optional[str] = None
+    agent_id: Optional[int] = None
+    series: List[RetentionPoint]
+    cohorts: List[RetentionCohort]
+
+class RetentionResponse(BaseModel):
+    group_by: Literal["all", "bar", "agent"]
+    months: List[date]
+    groups: List[RetentionGroup]
+
+class StaffTotals(BaseModel):
+    first_seen: date
+    last_seen: date
+    days: int
+    profit: float
+    drinks: float
+    rentability: float  # profit/day
+    mismatch_rows: int
+
+class StaffBar(StaffTotals):
+    bar: str
+
+class StaffAgentSpan(BaseModel):
+    bar: str
+    agent_id: Optional[int]
+    first_month: date
+    last_month: date
+
+class StaffMonth(BaseModel):
+    month: date
+    bar: str
+    agent_id: Optional[int]
+    days: int
+    profit: float
+    drinks: float
+    mismatch_rows: int
+
+class StaffProfileResponse(BaseModel):
+    staff_id: str
+    lifetime: StaffTotals
+    bars: List[StaffBar]
+    agents: List[StaffAgentSpan]  # Consecutive months with the same agent, oldest first
+    months: List[StaffMonth]
+    recent_rows: List[FactRowResponse]
+
+class PivotResponse(BaseModel):
+    dimensions: List[str]
+    measures: List[str]  # Record keys, e.g. "sum_profit"
+    source: Literal["rollup", "facts"]
+    truncated: bool
+    rows: List[dict[str, Any]]
+
+# --- Helpers ---
+
+def _days_remaining(end_date: date, today: date) -> int:
+    """Days left in the month of end_date, 0 for historical reports."""
+    if (today.year, today.month) != (end_date.year, end_date.month):
+        return 0
+    next_month = end_date.replace(day=28) + timedelta(days=4)
+    last_day_month = next_month - timedelta(days=next_month.day)
+    return max(0, (last_day_month - today).days)
+
+
+def _month_bounds(year: int, month: int) -> tuple[date, date]:
+    start = date(year, month, 1)
+    next_month = start.replace(day=28) + timedelta(days=4)
+    return start, next_month - timedelta(days=next_month.day)
+
+
+def _parse_period(spec: str) -> tuple[date, date]:
+    """Parse "YYYY-MM" (whole month) or "YYYY-MM-DD:YYYY-MM-DD"."""
+    try:
+        if ":" in spec:
+            start_str, end_str = spec.split(":", 1)
+            start = date.fromisoformat(start_str)
+            end = date.fromisoformat(end_str)
+        else:
+            month_start = datetime.strptime(spec, "%Y-%m").date()
+            start, end = _month_bounds(month_start.year, month_start.month)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid period '{spec}' (expected YYYY-MM or YYYY-MM-DD:YYYY-MM-DD)",
+        )
+    if end < start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid period '{spec}': end before start",
+        )
+    return start, end
+
+def _staff_totals(months: list) -> dict:
+    """Lifetime measures over StaffMonthlyActivity rows."""
+    days = sum(m.days for m in months)
+    profit = sum(float(m.profit_sum) for m in months)
+    return {
+        "first_seen": min(m.first_seen for m in months),
+        "last_seen": max(m.last_seen for m in months),
+        "days": days,
+        "profit": profit,
+        "drinks": sum(float(m.drinks_sum) for m in months),
+        "rentability": profit / days if days else 0.0,
+        "mismatch_rows": sum(m.mismatch_rows for m in months),
+    }
+
+
+def _add_months(month_start: date, months: int) -> date:
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _previous_period(start: date, end: date) -> tuple[date, date]:
+    """The calendar month before a whole month, else the same number of days before."""
+    if (start, end) == _month_bounds(start.year, start.month):
+        previous = start - timedelta(days=1)
+        return _month_bounds(previous.year, previous.month)
+    return start - (end - start) - timedelta(days=1), start - timedelta(days=1)
+
+
+def _compare_aggregate(group_by: str, model, start: date, end: date, filters, name: str):
+    """Profit, drinks and days per entity over one period."""
+    keys = [getattr(model, key) for key in COMPARE_KEYS[group_by]]
+    if model is DailyRollup:
+        measures = [
+            func.sum(DailyRollup.profit_sum),
+            func.sum(DailyRollup.drinks_sum),
+            func.count(distinct(DailyRollup.date)),
+        ]
+    else:
+        measures = [
+            func.coalesce(func.sum(FactRow.profit), 0),
+            func.coalesce(func.sum(FactRow.drinks), 0),
+            # One fact row per (bar, date, staff): rows are days for staff
+            func.count() if group_by == "staff" else func.count(distinct(FactRow.day)),
+        ]
+    query = (
+        select(*keys, *(m.label(label) for m, label in zip(measures, ("profit", "drinks", "days"))))
+        .where(model.date >= start, model.date < end + timedelta(days=1))
+        .group_by(*keys)
+    )
+    if group_by == "agent":
+        query = query.where(model.agent_id_derived.is_not(None))
+    return filters.apply(query, exclude=PERIOD_FILTERS, model=model).subquery(name)
+
+
+def _compare_metrics(profit, drinks, days) -> CompareMetrics:
+    profit, drinks, days = float(profit or 0), float(drinks or 0), int(days or 0)
+    return CompareMetrics(
+        profit=profit,
+        drinks=drinks,
+        days=days,
+        rentability=profit / days if days else 0.0,
+    )
+
 # --- Endpoints ---
 
 @router.get("/payroll", response_model=PayrollResponse)
@@ -73,13 +363,152 @@ async def get_payroll(
     start_date: date,
     end_date: date,
     bar: Optional[str] = None,
+    approx: bool = False,
     db: AsyncSession = Depends(get_db),
     # current_user = Depends(deps.get_current_active_user) # Assuming auth needed
 ):
     """
     Calculate payroll bonuses (A, B, C) for the given period.
+    Closed months are served from their frozen snapshot.
+    approx=true estimates the staff pools from sketches (see pool_error);
+    bonus amounts are always exact.
     """
+    if (start_date, end_date) == _month_bounds(start_date.year, start_date.month):
+        snapshot = await get_snapshot(db, start_date, bar)
+        if snapshot:
+            return PayrollResponse(
+                agents=[AgentPayroll(**a) for a in snapshot.agents],
+                period_start=start_date,
+                period_end=end_date,
+                closed_at=snapshot.closed_at,
+                data_version=snapshot.data_version,
+            )
+
+    # The in-memory engine counts pools exactly
+    approx = approx and await get_engine() is None
+    agents = await _compute_payroll(db, start_date, end_date, bar, approx)
+    return PayrollResponse(
+        agents=agents,
+        period_start=start_date,
+        period_end=end_date,
+        pool_error=RELATIVE_ERROR if approx else None,
+    )
+
+
+@router.post("/payroll/close", response_model=PayrollResponse)
+async def close_payroll_month(
+    current_user: CurrentAdmin,
+    month: str,
+    bar: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Close a finished month ("YYYY-MM"): compute its payroll once and freeze it.
+    The snapshot is served by /payroll until an import touches that month.
+    """
+    start_date, end_date = _parse_period(month)
+    if (start_date, end_date) != _month_bounds(start_date.year, start_date.month):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="month must be a calendar month (YYYY-MM)",
+        )
+    if end_date >= date.today():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only finished months can be closed",
+        )
+
+    data_version = await get_data_version(db)
+    agents = await _compute_payroll(db, start_date, end_date, bar)
+    snapshot = await save_snapshot(
+        db,
+        month=start_date,
+        bar=bar,
+        agents=[a.model_dump() for a in agents],
+        data_version=data_version,
+        closed_by_id=current_user.id,
+    )
+    await db.commit()
+    invalidate_data_version()
+
+    return PayrollResponse(
+        agents=agents,
+        period_start=start_date,
+        period_end=end_date,
+        closed_at=snapshot.closed_at,
+        data_version=snapshot.data_version,
+    )
+
+
+async def _staff_pools(
+    db: AsyncSession,
+    active_cutoff: date,
+    approx: bool = False,
+) -> tuple[dict[str, int], dict[str, int]]:
+    """
+    Distinct staff per "BAR|ID" agent: (since active_cutoff, all time).
+    With `approx`, estimated from the daily staff sketches.
+    """
+    def get_key(r_bar, r_agent_id):
+        return f"{r_bar}|{r_agent_id}"
+
+    if approx:
+        agents = DailyStaffSketch.agent_id_derived.is_not(None)
+        group_by = ("bar", "agent_id_derived")
+        active = await approx_distinct_staff(db, [agents, DailyStaffSketch.date >= active_cutoff], group_by)
+        total = await approx_distinct_staff(db, [agents], group_by)
+        return (
+            {get_key(*key): count for key, count in active.items()},
+            {get_key(*key): count for key, count in total.items()},
+        )
+
+    stmt_active = (
+        select(
+            FactRow.bar,
+            FactRow.agent_id_derived,
+            func.count(distinct(FactRow.staff_key))
+        )
+        .where(
+            FactRow.date >= active_cutoff,
+            FactRow.agent_id_derived.is_not(None)
+        )
+        .group_by(FactRow.bar, FactRow.agent_id_derived)
+    )
     
+    result_active = await db.execute(stmt_active)
+    active_counts = {get_key(r.bar, r.agent_id_derived): r[2] for r in result_active.all()}
+    
+    # Total Pool (All time)
+    stmt_total = (
+        select(
+            FactRow.bar,
+            FactRow.agent_id_derived,
+            func.count(distinct(FactRow.staff_key))
+        )
+        .where(FactRow.agent_id_derived.is_not(None))
+        .group_by(FactRow.bar, FactRow.agent_id_derived)
+    )
+    
+    result_total = await db.execute(stmt_total)
+    total_counts = {get_key(r.bar, r.agent_id_derived): r[2] for r in result_total.all()}
+
+    return active_counts, total_counts
+
+
+async def _compute_payroll(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    bar: Optional[str],
+    approx: bool = False,
+) -> List[AgentPayroll]:
+    """
+    Compute payroll bonuses (A, B, C) per agent from fact rows.
+    With `approx`, the staff pools are sketch estimates (bonuses stay exact).
+    """
+    
+    rules = await get_active_rules(db)
+
     # 1. Fetch Daily Stats per Agent
     # We group by bar, agent_id_derived, and date
     
@@ -100,14 +529,18 @@ async def get_payroll(
             FactRow.agent_id_derived,
             FactRow.date,
             func.count(FactRow.id).label("staff_count"),
-            func.count(case((FactRow.profit >= 1500, 1), else_=None)).label("high_perf_count")
+            func.count(case((FactRow.profit >= rules.b_min_profit, 1), else_=None)).label("high_perf_count")
         )
         .where(and_(*filters))
         .group_by(FactRow.bar, FactRow.agent_id_derived, FactRow.date)
     )
     
-    result = await db.execute(stmt)
-    daily_rows = result.all()
+    engine = await get_engine()
+    if engine is not None:
+        daily_rows = engine.payroll_daily(start_date, end_date, bar, rules.b_min_profit)
+    else:
+        result = await db.execute(stmt)
+        daily_rows = result.all()
     
     # Process in Python to build agent maps
     agents_data = {} # Key: "BAR|ID"
@@ -134,14 +567,7 @@ async def get_payroll(
     # If end_date month != today month, assume 0 remaining (historical report)
     # If end_date month == today month, remaining = (last_day_of_month - today).days
     
-    is_current_month = (today.year == end_date.year) and (today.month == end_date.month)
-    if is_current_month:
-        # get last day of month
-        next_month = end_date.replace(day=28) + timedelta(days=4)
-        last_day_month = next_month - timedelta(days=next_month.day)
-        days_remaining = max(0, (last_day_month - today).days)
-    else:
-        days_remaining = 0
+    days_remaining = _days_remaining(end_date, today)
 
     # 2. Iterate daily records
     for row in daily_rows:
@@ -158,11 +584,11 @@ async def get_payroll(
         
         # Bonus A Logic: 
         # IF daily_staff_count >= 10 THEN 50 * daily_staff_count. Else 0.
-        bonus_a = 50 * row.staff_count if row.staff_count >= 10 else 0
+        bonus_a = rules.bonus_a(row.staff_count)
         
         # Bonus B Logic:
         # +50 THB for each staff with profit >= 1500
-        bonus_b = 50 * row.high_perf_count
+        bonus_b = rules.bonus_b(row.high_perf_count)
         
         agents_data[key]["daily_stats"].append({
             "date": row.date,
@@ -181,35 +607,10 @@ async def get_payroll(
     # Active Pool (last 31 days)
     active_cutoff = today - timedelta(days=31)
     
-    stmt_active = (
-        select(
-            FactRow.bar,
-            FactRow.agent_id_derived,
-            func.count(distinct(FactRow.staff_id))
-        )
-        .where(
-            FactRow.date >= active_cutoff,
-            FactRow.agent_id_derived.is_not(None)
-        )
-        .group_by(FactRow.bar, FactRow.agent_id_derived)
-    )
-    
-    result_active = await db.execute(stmt_active)
-    active_counts = {get_key(r.bar, r.agent_id_derived): r[2] for r in result_active.all()}
-    
-    # Total Pool (All time)
-    stmt_total = (
-        select(
-            FactRow.bar,
-            FactRow.agent_id_derived,
-            func.count(distinct(FactRow.staff_id))
-        )
-        .where(FactRow.agent_id_derived.is_not(None))
-        .group_by(FactRow.bar, FactRow.agent_id_derived)
-    )
-    
-    result_total = await db.execute(stmt_total)
-    total_counts = {get_key(r.bar, r.agent_id_derived): r[2] for r in result_total.all()}
+    if engine is not None:
+        active_counts, total_counts = engine.staff_pools(active_cutoff)
+    else:
+        active_counts, total_counts = await _staff_pools(db, active_cutoff, approx)
 
     # 4. Final Assembly
     final_agents = []
@@ -237,22 +638,7 @@ async def get_payroll(
         avg_staff = sum_staff / count_days_played if count_days_played > 0 else 0
         
         # Tiers
-        bonus_c = 0
-        current_tier = 0
-        next_tier_target = 20
-        
-        if avg_staff >= 40:
-            bonus_c = 40000
-            current_tier = 40000
-            next_tier_target = None
-        elif avg_staff >= 30:
-            bonus_c = 30000
-            current_tier = 30000
-            next_tier_target = 40
-        elif avg_staff >= 20:
-            bonus_c = 20000
-            current_tier = 20000
-            next_tier_target = 30
+        bonus_c, current_tier, next_tier_target = rules.bonus_c_tier(avg_staff)
         
         # Pool stats
         pool_active = active_counts.get(key, 0)
@@ -279,12 +665,245 @@ async def get_payroll(
         )
         final_agents.append(agent_resp)
         
-    return PayrollResponse(
-        agents=final_agents,
+    return final_agents
+
+@router.post("/payroll/simulate", response_model=PayrollSimulationResponse)
+async def simulate_payroll(
+    current_user: CurrentUser,
+    request: PayrollSimulationRequest,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Bonus cost of candidate rule sets over a year of agent-daily data.
+
+    The active rules come first, followed by the saved `rule_set_ids` and
+    the unsaved `rule_sets`. Bonus C is evaluated per calendar month, as in
+    the monthly payroll. One query fetches the daily data, with a high
+    performer count per distinct B threshold; every rule set is then
+    evaluated in memory.
+    """
+    saved = []
+    if request.rule_set_ids:
+        result = await db.execute(select(BonusRuleSet).where(BonusRuleSet.id.in_(request.rule_set_ids)))
+        by_id = {rule_set.id: rule_set for rule_set in result.scalars().all()}
+        missing = [i for i in request.rule_set_ids if i not in by_id]
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Bonus rule sets not found: {', '.join(map(str, missing))}",
+            )
+        saved = [BonusRules.from_model(by_id[i]) for i in request.rule_set_ids]
+
+    rule_sets = [
+        await get_active_rules(db),
+        *saved,
+        *(
+            BonusRules.from_values(
+                spec.name,
+                [(tier.min_avg_staff, tier.amount) for tier in spec.c_tiers],
+                **spec.model_dump(exclude={"name", "c_tiers"}),
+            )
+            for spec in request.rule_sets
+        ),
+    ]
+    if len(rule_sets) > MAX_SIMULATED_RULE_SETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_SIMULATED_RULE_SETS} rule sets per simulation",
+        )
+
+    start_date, end_date = date(request.year, 1, 1), date(request.year, 12, 31)
+    days = await fetch_agent_days(db, start_date, end_date, request.bar, {r.b_min_profit for r in rule_sets})
+    costs = simulate(days, rule_sets)
+
+    return PayrollSimulationResponse(
         period_start=start_date,
-        period_end=end_date
+        period_end=end_date,
+        rule_sets=[
+            SimulatedRuleSet(
+                name=rules.name,
+                bonus_a=int(costs[i, :, 0].sum()),
+                bonus_b=int(costs[i, :, 1].sum()),
+                bonus_c=int(costs[i, :, 2].sum()),
+                total=int(costs[i].sum()),
+            )
+            for i, rules in enumerate(rule_sets)
+        ],
+        agents=[
+            SimulatedAgentCost(
+                agent_id=f"{agent_bar}|{agent_id}",
+                agent_name=f"Agent {agent_id} ({agent_bar})",
+                bar=agent_bar,
+                totals=[int(total) for total in costs[:, code, :].sum(axis=1)],
+            )
+            for code, (agent_bar, agent_id) in sorted(enumerate(days.agents), key=lambda item: item[1])
+        ],
     )
 
+
+@router.get("/payroll/series", response_model=PayrollSeriesResponse)
+async def get_payroll_series(
+    year: Optional[int] = Query(None, ge=2000, le=2100),
+    period: Optional[List[str]] = Query(None),
+    bar: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Payroll bonuses (A, B, C) for several periods at once.
+
+    Pass either `year` (one period per month) or repeated `period` values
+    ("YYYY-MM" or "YYYY-MM-DD:YYYY-MM-DD"). All periods are computed by a
+    single statement: daily agent aggregates joined to the period list, then
+    window functions roll them up per (period, agent).
+    """
+    if period:
+        bounds = [_parse_period(p) for p in period]
+    elif year:
+        bounds = [_month_bounds(year, m) for m in range(1, 13)]
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide either year or at least one period",
+        )
+    if len(bounds) > MAX_SERIES_PERIODS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_SERIES_PERIODS} periods per request",
+        )
+
+    periods = (
+        values(
+            column("idx", Integer),
+            column("period_start", Date),
+            column("period_end", Date),
+            name="periods",
+        )
+        .data([(i, start, end) for i, (start, end) in enumerate(bounds)])
+    )
+
+    filters = [
+        # Overall window first so the scan is bounded before the period join
+        FactRow.date >= min(start for start, _ in bounds),
+        FactRow.date <= max(end for _, end in bounds),
+        FactRow.date >= periods.c.period_start,
+        FactRow.date <= periods.c.period_end,
+        FactRow.agent_id_derived.is_not(None),
+    ]
+    if bar:
+        filters.append(FactRow.bar == bar)
+
+    rules = await get_active_rules(db)
+
+    # Daily aggregates per (period, agent, date)
+    staff_count = func.count(FactRow.id)
+    high_perf_count = func.count(case((FactRow.profit >= rules.b_min_profit, 1), else_=None))
+    daily = (
+        select(
+            periods.c.idx,
+            FactRow.bar,
+            FactRow.agent_id_derived,
+            staff_count.label("staff_count"),
+            case(
+                (staff_count >= rules.a_min_staff, staff_count * rules.a_per_staff),
+                else_=0,
+            ).label("bonus_a"),
+            (high_perf_count * rules.b_per_staff).label("bonus_b"),
+        )
+        .select_from(FactRow)
+        .join(periods, and_(*filters))
+        .group_by(periods.c.idx, FactRow.bar, FactRow.agent_id_derived, FactRow.date)
+        .subquery("daily")
+    )
+
+    # Roll daily rows up per (period, agent) with window functions
+    w = dict(partition_by=[daily.c.idx, daily.c.bar, daily.c.agent_id_derived])
+    per_agent = (
+        select(
+            daily.c.idx,
+            daily.c.bar,
+            daily.c.agent_id_derived,
+            func.sum(daily.c.bonus_a).over(**w).label("bonus_a_total"),
+            func.sum(daily.c.bonus_b).over(**w).label("bonus_b_total"),
+            func.sum(daily.c.staff_count).over(**w).label("sum_staff"),
+            func.count().over(**w).label("days_counted"),
+            func.row_number().over(**w).label("rn"),
+        )
+        .subquery("per_agent")
+    )
+
+    # Pools (active in last 31 days / all time), one pass over the agent's history
+    today = date.today()
+    active_cutoff = today - timedelta(days=31)
+    pool_filters = [FactRow.agent_id_derived.is_not(None)]
+    if bar:
+        pool_filters.append(FactRow.bar == bar)
+    pools = (
+        select(
+            FactRow.bar,
+            FactRow.agent_id_derived,
+            func.count(distinct(FactRow.staff_key))
+            .filter(FactRow.date >= active_cutoff)
+            .label("pool_active"),
+            func.count(distinct(FactRow.staff_key)).label("pool_total"),
+        )
+        .where(and_(*pool_filters))
+        .group_by(FactRow.bar, FactRow.agent_id_derived)
+        .subquery("pools")
+    )
+
+    stmt = (
+        select(
+            per_agent.c.idx,
+            per_agent.c.bar,
+            per_agent.c.agent_id_derived,
+            per_agent.c.bonus_a_total,
+            per_agent.c.bonus_b_total,
+            per_agent.c.sum_staff,
+            per_agent.c.days_counted,
+            func.coalesce(pools.c.pool_active, 0).label("pool_active"),
+            func.coalesce(pools.c.pool_total, 0).label("pool_total"),
+        )
+        .outerjoin(
+            pools,
+            and_(
+                pools.c.bar == per_agent.c.bar,
+                pools.c.agent_id_derived == per_agent.c.agent_id_derived,
+            ),
+        )
+        .where(per_agent.c.rn == 1)
+        .order_by(per_agent.c.idx, per_agent.c.bar, per_agent.c.agent_id_derived)
+    )
+
+    result = await db.execute(stmt)
+
+    agents_by_period: dict[int, List[AgentPayroll]] = {i: [] for i in range(len(bounds))}
+    for row in result.all():
+        avg_staff = row.sum_staff / row.days_counted if row.days_counted else 0
+        bonus_c, current_tier, next_tier_target = rules.bonus_c_tier(avg_staff)
+        bonus_a_total = int(row.bonus_a_total or 0)
+        bonus_b_total = int(row.bonus_b_total or 0)
+        agents_by_period[row.idx].append(AgentPayroll(
+            agent_id=f"{row.bar}|{row.agent_id_derived}",
+            agent_name=f"Agent {row.agent_id_derived} ({row.bar})",
+            bar=row.bar,
+            pool_active=row.pool_active,
+            pool_total=row.pool_total,
+            bonus_a_total=bonus_a_total,
+            bonus_b_total=bonus_b_total,
+            avg_daily_staff=round(avg_staff, 1),
+            days_counted=row.days_counted,
+            days_remaining=_days_remaining(bounds[row.idx][1], today),
+            current_tier=current_tier,
+            next_tier_target=next_tier_target,
+            bonus_c_amount=bonus_c,
+            total_estimate=bonus_a_total + bonus_b_total + bonus_c,
+        ))
+
+    return PayrollSeriesResponse(periods=[
+        PayrollPeriod(period_start=start, period_end=end, agents=agents_by_period[i])
+        for i, (start, end) in enumerate(bounds)
+    ])
+
 @router.get("/leaderboard", response_model=LeaderboardResponse)
 async def get_leaderboard(
     type: Literal["STAFF", "AGENT"],
@@ -294,22 +913,29 @@ async def get_leaderboard(
     bar: Optional[str] = None,
     year: Optional[int] = None,
     month: Optional[int] = None,
+    approx: bool = False,
     db: AsyncSession = Depends(get_db)
 ):
+    """
+    Staff or agent ranking.
+    approx=true avoids count(DISTINCT date): staff days are counted as rows
+    (one fact row per bar, date and staff) and agents are read from the
+    daily rollups. Both give the same days as the default plan.
+    """
+    # Agents at rollup grain when approximating
+    model = DailyRollup if approx and type == "AGENT" else FactRow
     filters = []
     if bar:
-        filters.append(FactRow.bar == bar)
+        filters.append(model.bar == bar)
     if year:
-        filters.append(FactRow.source_year == year)
-    # for month we might need to extract from date or use generated column logic if trustworthy. 
-    # FactRow model has 'date' (DateTime).
+        filters.append(model.source_year == year)
     if month:
-        filters.append(func.extract('month', FactRow.date) == month)
+        filters.append(model.month == month)
         
     if search:
         # Search staff_id or agent
         if type == "STAFF":
-            filters.append(FactRow.staff_id.ilike(f"%{search}%"))
+            filters.append(staff_search_condition(FactRow.staff_id, search))
         else:
             # For agent search, it's a bit harder since we construct the name.
             # But we can search bar or agent_label?
@@ -317,34 +943,47 @@ async def get_leaderboard(
 
     # Grouping
     if type == "STAFF":
-        group_cols = [FactRow.bar, FactRow.agent_id_derived, FactRow.staff_id]
+        # Grouped on the integer key; Staff.id also determines Staff.staff_id
+        group_cols = [FactRow.bar, FactRow.agent_id_derived, Staff.id]
         select_cols = [
-            FactRow.staff_id.label("id"),
-            FactRow.staff_id.label("name"),
+            Staff.staff_id.label("id"),
+            Staff.staff_id.label("name"),
             FactRow.bar.label("bar"),
             FactRow.agent_id_derived.label("agent_id"),
             func.sum(FactRow.profit).label("profit"),
             func.sum(FactRow.drinks).label("drinks"),
-            func.count(distinct(FactRow.date)).label("days")
+            (func.count(FactRow.id) if approx else func.count(distinct(FactRow.date))).label("days")
         ]
     else: # AGENT
-        group_cols = [FactRow.bar, FactRow.agent_id_derived]
+        group_cols = [model.bar, model.agent_id_derived]
+        if approx:
+            measures = [
+                # NULL like SUM(profit) when no row has a value
+                func.sum(DailyRollup.profit_sum).filter(DailyRollup.profit_count > 0).label("profit"),
+                func.sum(DailyRollup.drinks_sum).filter(DailyRollup.drinks_count > 0).label("drinks"),
+            ]
+        else:
+            measures = [
+                func.sum(FactRow.profit).label("profit"),
+                func.sum(FactRow.drinks).label("drinks"),
+            ]
         select_cols = [
-            func.concat(FactRow.bar, '|', FactRow.agent_id_derived).label("id"),
-            func.concat('Agent ', FactRow.agent_id_derived, ' (', FactRow.bar, ')').label("name"),
-            FactRow.bar.label("bar"),
-            FactRow.agent_id_derived.label("agent_id"),
-            func.sum(FactRow.profit).label("profit"),
-            func.sum(FactRow.drinks).label("drinks"),
-            func.count(distinct(FactRow.date)).label("days")
+            func.concat(model.bar, '|', model.agent_id_derived).label("id"),
+            func.concat('Agent ', model.agent_id_derived, ' (', model.bar, ')').label("name"),
+            model.bar.label("bar"),
+            model.agent_id_derived.label("agent_id"),
+            *measures,
+            func.count(distinct(model.date)).label("days")
         ]
-        filters.append(FactRow.agent_id_derived.is_not(None))
+        filters.append(model.agent_id_derived.is_not(None))
 
     stmt = (
         select(*select_cols)
         .where(and_(*filters))
         .group_by(*group_cols)
     )
+    if type == "STAFF":
+        stmt = stmt.join_from(FactRow, Staff, Staff.id == FactRow.staff_key)
 
     # Sorting
     if sort_by == "PROFIT":
@@ -367,8 +1006,12 @@ async def get_leaderboard(
     if mode in ["TOP10", "FLOP10"]:
         stmt = stmt.limit(10)
         
-    result = await db.execute(stmt)
-    rows = result.all()
+    engine = await get_engine()
+    if engine is not None:
+        rows = engine.leaderboard(type, mode, sort_by, search, bar, year, month)
+    else:
+        result = await db.execute(stmt)
+        rows = result.all()
     
     entries = []
     for i, row in enumerate(rows):
@@ -394,3 +1037,528 @@ async def get_leaderboard(
         ))
         
     return LeaderboardResponse(entries=entries)
+
+
+@router.get("/pivot", response_model=PivotResponse)
+async def get_pivot(
+    filters: RowFiltersDep,
+    dimension: Optional[List[str]] = Query(None),
+    measure: Optional[List[str]] = Query(None),
+    cube: bool = False,
+    limit: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Aggregate fact rows by whitelisted dimensions in one query.
+
+    - dimension: bar, agent, staff, year, month, week, contract, position
+      (repeat or comma-separate; month/week are bucket start dates)
+    - measure: aggregate:field with aggregate sum/avg/count/distinct and field
+      profit/drinks/sale/total, plus count:rows and distinct:staff
+    - cube: add subtotal rows (GROUP BY CUBE); `grouping` flags the
+      dimensions a row totals over
+    Filters are the /rows filters. Served from daily rollups unless the
+    request needs row-level data (staff, distinct, staff_search).
+    """
+    dimensions = parse_dimensions(dimension)
+    measures = parse_measures(measure)
+    use_rollup = can_use_rollup(dimensions, measures, filters)
+
+    query = build_pivot_query(dimensions, measures, filters, cube, use_rollup)
+    result = await db.execute(query.limit(limit + 1))
+    rows = result.all()
+
+    return PivotResponse(
+        dimensions=dimensions,
+        measures=[m.name for m in measures],
+        source="rollup" if use_rollup else "facts",
+        truncated=len(rows) > limit,
+        rows=pivot_records(rows[:limit], dimensions, measures, cube),
+    )
+
+
+def _timeseries_metric(name: str, use_rollup: bool):
+    if use_rollup:
+        if name == "rows":
+            return func.sum(DailyRollup.rows)
+        return func.sum(getattr(DailyRollup, f"{name}_sum"))
+    if name == "rows":
+        return func.count()
+    if name == "staff":
+        return func.count(distinct(FactRow.staff_key))
+    return func.coalesce(func.sum(getattr(FactRow, name)), 0)
+
+
+@router.get("/timeseries", response_model=TimeseriesResponse)
+async def get_timeseries(
+    filters: RowFiltersDep,
+    bucket: Literal["day", "week", "month"] = "day",
+    metric: Optional[List[str]] = Query(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Metrics per day/week/month bucket in one query, with empty buckets
+    filled with 0. Metrics: profit, drinks, sale, rows, staff (distinct
+    staff). Filters are the /rows filters; the series spans start_date to
+    end_date when given, else the filtered data. Served from daily rollups
+    unless staff or staff_search is requested.
+    """
+    metrics = list(dict.fromkeys(name.strip() for value in metric or ["profit,drinks,rows"] for name in value.split(",") if name.strip()))
+    unknown = [name for name in metrics if name not in TIMESERIES_METRICS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown metrics: {', '.join(unknown)}",
+        )
+    if filters.date_range:
+        span_days = (filters.date_range[1] - filters.date_range[0]).days
+        points = span_days // {"day": 1, "week": 7, "month": 28}[bucket] + 1
+        if points > MAX_TIMESERIES_POINTS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"At most {MAX_TIMESERIES_POINTS} buckets per request",
+            )
+
+    use_rollup = "staff" not in metrics and filters.supports(DailyRollup)
+    model = DailyRollup if use_rollup else FactRow
+    bucket_expr = truncate_date(bucket, model.date)
+
+    # Aggregate per bucket
+    agg = filters.apply(
+        select(bucket_expr.label("bucket"), *(_timeseries_metric(name, use_rollup).label(name) for name in metrics)),
+        model=model,
+    ).group_by(bucket_expr).cte("agg")
+
+    # Bucket range: requested dates, else the data
+    if filters.date_range:
+        low, high = (truncate_date(bucket, literal_column(f"DATE '{d.isoformat()}'")) for d in filters.date_range)
+    else:
+        low = select(func.min(agg.c.bucket)).scalar_subquery()
+        high = select(func.max(agg.c.bucket)).scalar_subquery()
+    series = func.generate_series(
+        low, high, literal_column(f"INTERVAL '1 {bucket}'")
+    ).table_valued("bucket").render_derived("series")
+    series_bucket = cast(series.c.bucket, Date)
+
+    query = (
+        select(series_bucket.label("bucket"), *(func.coalesce(agg.c[name], 0).label(name) for name in metrics))
+        .select_from(series.outerjoin(agg, agg.c.bucket == series_bucket))
+        .order_by(series_bucket)
+    )
+    result = await db.execute(query)
+    rows = result.all()
+
+    return TimeseriesResponse(
+        bucket=bucket,
+        source="rollup" if use_rollup else "facts",
+        buckets=[row.bucket for row in rows],
+        series={name: [float(getattr(row, name)) for row in rows] for name in metrics},
+    )
+
+
+def _distribution_columns(value) -> list:
+    """min, max, mean and p10/median/p90 (one percentile_cont call) of a daily value."""
+    name = value.key
+    return [
+        func.min(value).label(f"{name}_min"),
+        func.max(value).label(f"{name}_max"),
+        func.avg(value).label(f"{name}_mean"),
+        type_coerce(
+            func.percentile_cont(array([0.1, 0.5, 0.9])).within_group(value), ARRAY(Float)
+        ).label(f"{name}_pct"),
+    ]
+
+
+def _distribution_stats(row, name: str) -> DistributionStats:
+    p10, median, p90 = getattr(row, f"{name}_pct")
+    return DistributionStats(
+        min=float(getattr(row, f"{name}_min")),
+        max=float(getattr(row, f"{name}_max")),
+        mean=float(getattr(row, f"{name}_mean")),
+        median=float(median),
+        p10=float(p10),
+        p90=float(p90),
+    )
+
+
+@router.get("/distribution", response_model=DistributionResponse)
+async def get_distribution(
+    type: Literal["STAFF", "AGENT"],
+    filters: RowFiltersDep,
+    staff_id: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Distribution of daily profit and drinks per staff or agent: min, max,
+    mean, median, p10 and p90 over the days worked in the filtered set,
+    computed in Postgres (percentile_cont). Ordered by median daily profit.
+    staff_id selects a single staff exactly (profile pages) and is only
+    accepted with type=STAFF; agents are selected with the `agent` filter.
+    Agent days come from daily rollups unless staff_search is set.
+    """
+    if staff_id and type == "AGENT":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="staff_id applies to type=STAFF only; use the agent filter for agents",
+        )
+
+    # Daily totals per entity
+    if type == "STAFF":
+        keys = [FactRow.bar, FactRow.agent_id_derived, FactRow.staff_key]
+        daily = select(
+            *keys,
+            FactRow.day.label("day"),
+            func.coalesce(func.sum(FactRow.profit), 0).label("profit"),
+            func.coalesce(func.sum(FactRow.drinks), 0).label("drinks"),
+        ).group_by(*keys, FactRow.day)
+        daily = filters.apply(daily)
+        if staff_id:
+            daily = daily.where(FactRow.staff_id == staff_id)
+    else:
+        model = DailyRollup if filters.supports(DailyRollup) else FactRow
+        keys = [model.bar, model.agent_id_derived]
+        if model is DailyRollup:
+            day, profit, drinks = DailyRollup.date, func.sum(DailyRollup.profit_sum), func.sum(DailyRollup.drinks_sum)
+        else:
+            day, profit, drinks = FactRow.day, func.coalesce(func.sum(FactRow.profit), 0), func.coalesce(func.sum(FactRow.drinks), 0)
+        daily = select(
+            *keys, day.label("day"), profit.label("profit"), drinks.label("drinks"),
+        ).where(model.agent_id_derived.is_not(None)).group_by(*keys, day)
+        daily = filters.apply(daily, model=model)
+    daily = daily.subquery("daily")
+
+    entity = [daily.c.bar, daily.c.agent_id_derived] + ([Staff.id] if type == "STAFF" else [])
+    median_profit = func.percentile_cont(0.5).within_group(daily.c.profit)
+    stmt = (
+        select(
+            *entity,
+            func.count().label("days"),
+            *_distribution_columns(daily.c.profit),
+            *_distribution_columns(daily.c.drinks),
+        )
+        .group_by(*entity)
+        .order_by(median_profit.desc(), *entity)
+        .limit(limit)
+    )
+    if type == "STAFF":
+        stmt = stmt.add_columns(Staff.staff_id).join_from(daily, Staff, Staff.id == daily.c.staff_key)
+    result = await db.execute(stmt)
+
+    entries = []
+    for row in result:
+        if type == "STAFF":
+            entry_id, name = row.staff_id, row.staff_id
+        else:
+            entry_id, name = f"{row.bar}|{row.agent_id_derived}", f"Agent {row.agent_id_derived} ({row.bar})"
+        entries.append(DistributionEntry(
+            id=entry_id,
+            name=name,
+            bar=row.bar,
+            agent_id=row.agent_id_derived,
+            days=row.days,
+            profit=_distribution_stats(row, "profit"),
+            drinks=_distribution_stats(row, "drinks"),
+        ))
+
+    return DistributionResponse(entries=entries)
+
+
+@router.get("/compare", response_model=CompareResponse)
+async def compare_periods(
+    group_by: Literal["staff", "agent", "bar"],
+    current: str,
+    filters: RowFiltersDep,
+    previous: Optional[str] = None,
+    sort_by: Literal["CURRENT", "DELTA"] = "CURRENT",
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Period-over-period profit, drinks, days and rentability per staff,
+    agent or bar, in one statement: both periods are aggregated and FULL
+    OUTER JOINed, so entities present in only one period are included.
+
+    Periods are "YYYY-MM" or "YYYY-MM-DD:YYYY-MM-DD"; `previous` defaults to
+    the month (or same-length range) before `current`. Row filters apply
+    to both periods except their date, year and month. Agents and bars are
+    read from daily rollups unless staff_search is set.
+    """
+    current_start, current_end = _parse_period(current)
+    previous_start, previous_end = _parse_period(previous) if previous else _previous_period(current_start, current_end)
+
+    model = FactRow if group_by == "staff" or not filters.supports(DailyRollup) else DailyRollup
+    cur = _compare_aggregate(group_by, model, current_start, current_end, filters, "cur")
+    prev = _compare_aggregate(group_by, model, previous_start, previous_end, filters, "prev")
+    keys = COMPARE_KEYS[group_by]
+
+    delta_profit = func.coalesce(cur.c.profit, 0) - func.coalesce(prev.c.profit, 0)
+    stmt = (
+        select(
+            *(func.coalesce(cur.c[key], prev.c[key]).label(key) for key in keys),
+            (cur.c.days.is_not(None)).label("in_current"),
+            (prev.c.days.is_not(None)).label("in_previous"),
+            cur.c.profit.label("current_profit"),
+            cur.c.drinks.label("current_drinks"),
+            cur.c.days.label("current_days"),
+            prev.c.profit.label("previous_profit"),
+            prev.c.drinks.label("previous_drinks"),
+            prev.c.days.label("previous_days"),
+        )
+        .select_from(cur.join(prev, and_(*(cur.c[key] == prev.c[key] for key in keys)), full=True))
+        .order_by(
+            (delta_profit if sort_by == "DELTA" else func.coalesce(cur.c.profit, 0)).desc(),
+            *(literal_column(key) for key in keys),
+        )
+        .limit(limit)
+    )
+    if group_by == "staff":
+        stmt = stmt.add_columns(
+            select(Staff.staff_id)
+            .where(Staff.id == func.coalesce(cur.c.staff_key, prev.c.staff_key))
+            .scalar_subquery()
+            .label("staff_id")
+        )
+    result = await db.execute(stmt)
+
+    entries = []
+    for row in result:
+        if group_by == "staff":
+            entry_id, name, agent_id = row.staff_id, row.staff_id, None
+        elif group_by == "agent":
+            entry_id, name = f"{row.bar}|{row.agent_id_derived}", f"Agent {row.agent_id_derived} ({row.bar})"
+            agent_id = row.agent_id_derived
+        else:
+            entry_id, name, agent_id = row.bar, row.bar, None
+        current_metrics = _compare_metrics(row.current_profit, row.current_drinks, row.current_days)
+        previous_metrics = _compare_metrics(row.previous_profit, row.previous_drinks, row.previous_days)
+        entries.append(CompareEntry(
+            id=entry_id,
+            name=name,
+            bar=row.bar,
+            agent_id=agent_id,
+            current=current_metrics if row.in_current else None,
+            previous=previous_metrics if row.in_previous else None,
+            delta=CompareMetrics(
+                profit=current_metrics.profit - previous_metrics.profit,
+                drinks=current_metrics.drinks - previous_metrics.drinks,
+                days=current_metrics.days - previous_metrics.days,
+                rentability=current_metrics.rentability - previous_metrics.rentability,
+            ),
+        ))
+
+    return CompareResponse(
+        group_by=group_by,
+        source="rollup" if model is DailyRollup else "facts",
+        current_start=current_start,
+        current_end=current_end,
+        previous_start=previous_start,
+        previous_end=previous_end,
+        entries=entries,
+    )
+
+
+@router.get("/retention", response_model=RetentionResponse)
+async def get_retention(
+    months: int = Query(24, ge=1, le=MAX_RETENTION_MONTHS),
+    end: Optional[str] = None,
+    group_by: Literal["all", "bar", "agent"] = "bar",
+    bar: Optional[str] = None,
+    agent: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Monthly staff pool evolution: active, new, returning, retained and
+    churned staff per month, plus cohort retention (staff grouped by their
+    first month in the bar).
+
+    Computed in one statement over staff_monthly_activity: lag/lead over
+    each staff's months give the previous and next month worked, and min()
+    over the same window gives the cohort. A staff is identified per bar;
+    moving between agents of a bar is not churn. Grouped or filtered by
+    agent, a staff is identified per agent instead: moving to another agent
+    is churn for the first and new for the second, so each agent's series
+    adds up (active = previous active - churned + new + returning) and its
+    cohorts only hold staff who started with it. `end` ("YYYY-MM") defaults
+    to the latest month with data; `agent` is a "BAR|ID" key.
+    """
+    activity = StaffMonthlyActivity
+    if end:
+        end_month = _parse_period(end)[0].replace(day=1)
+    else:
+        end_month = (await db.execute(select(func.max(activity.month_start)))).scalar()
+        if end_month is None:
+            return RetentionResponse(group_by=group_by, months=[], groups=[])
+    first_month = _add_months(end_month, 1 - months)
+    month_list = [_add_months(first_month, i) for i in range(months)]
+
+    if group_by == "agent" or agent:
+        staff_window = {"partition_by": (activity.bar, activity.agent_id_derived, activity.staff_id)}
+    else:
+        staff_window = {"partition_by": (activity.bar, activity.staff_id)}
+    ordered_window = {**staff_window, "order_by": activity.month_start}
+    history = select(
+        activity.bar,
+        activity.agent_id_derived,
+        activity.month_start,
+        func.lag(activity.month_start).over(**ordered_window).label("previous_month"),
+        func.lead(activity.month_start).over(**ordered_window).label("next_month"),
+        func.min(activity.month_start).over(**staff_window).label("cohort"),
+    ).where(activity.month_start <= end_month)
+    if bar:
+        history = history.where(activity.bar == bar)
+    history = history.subquery("history")
+
+    one_month = literal_column("interval '1 month'")
+    keys = {"all": [], "bar": [history.c.bar], "agent": [history.c.bar, history.c.agent_id_derived]}[group_by]
+    stmt = (
+        select(
+            *keys,
+            history.c.month_start,
+            history.c.cohort,
+            func.count().label("active"),
+            func.count().filter(history.c.previous_month.is_(None)).label("new"),
+            func.count().filter(history.c.previous_month < history.c.month_start - one_month).label("returning"),
+            func.count().filter(or_(
+                history.c.next_month.is_(None),
+                history.c.next_month > history.c.month_start + one_month,
+            )).label("leaving"),
+        )
+        # The month before the window is only needed for its leavers
+        .where(history.c.month_start >= _add_months(first_month, -1))
+        .group_by(*keys, history.c.month_start, history.c.cohort)
+    )
+    if agent:
+        agent_conditions = parse_agent_keys([agent], history.c)
+        if not agent_conditions:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid agent key '{agent}' (expected BAR|ID)",
+            )
+        stmt = stmt.where(*agent_conditions)
+    result = await db.execute(stmt)
+
+    # Counts per group by (month, cohort), and summed per month
+    grouped: dict[tuple, tuple[dict, dict]] = {}
+    for row in result:
+        cells, totals = grouped.setdefault(tuple(row[:len(keys)]), ({}, {}))
+        cells[(row.month_start, row.cohort)] = row.active
+        total = totals.setdefault(row.month_start, [0, 0, 0, 0])
+        for i, count in enumerate((row.active, row.new, row.returning, row.leaving)):
+            total[i] += count
+
+    groups = []
+    for key in sorted(grouped, key=lambda k: tuple((v is None, v) for v in k)):
+        cells, totals = grouped[key]
+        series = []
+        for month in month_list:
+            active, new, returning, _ = totals.get(month, (0, 0, 0, 0))
+            series.append(RetentionPoint(
+                month=month,
+                active=active,
+                new=new,
+                returning=returning,
+                retained=active - new - returning,
+                churned=totals.get(_add_months(month, -1), (0, 0, 0, 0))[3],
+            ))
+
+        cohorts = []
+        for cohort in month_list:
+            if (cohort, cohort) not in cells:
+                continue
+            cohorts.append(RetentionCohort(
+                cohort=cohort,
+                size=cells[(cohort, cohort)],
+                active=[cells.get((month, cohort), 0) for month in month_list if month >= cohort],
+            ))
+
+        if group_by == "agent":
+            group_bar, agent_id = key
+            group_key = f"{group_bar}|{agent_id if agent_id is not None else 'NULL'}"
+        elif group_by == "bar":
+            group_bar, agent_id = key[0], None
+            group_key = group_bar
+        else:
+            group_bar, agent_id, group_key = None, None, "ALL"
+        groups.append(RetentionGroup(
+            key=group_key,
+            bar=group_bar,
+            agent_id=agent_id,
+            series=series,
+            cohorts=cohorts,
+        ))
+
+    return RetentionResponse(group_by=group_by, months=month_list, groups=groups)
+
+
+@router.get("/staff/{staff_id}", response_model=StaffProfileResponse)
+async def get_staff_profile(
+    staff_id: str,
+    recent: int = Query(20, ge=0, le=200),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Staff profile: lifetime and per-bar totals, per-month measures, agent
+    history and most recent rows. Aggregates come from the precomputed
+    staff_monthly_activity rows; recent rows use the (staff_id, date) index.
+    """
+    activity = StaffMonthlyActivity
+    months = (await db.execute(
+        select(activity)
+        .where(activity.staff_id == staff_id)
+        .order_by(activity.month_start, activity.bar)
+    )).scalars().all()
+    if not months:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Staff not found",
+        )
+    recent_rows = (await db.execute(
+        select(FactRow)
+        .where(FactRow.staff_id == staff_id)
+        .order_by(FactRow.date.desc())
+        .limit(recent)
+    )).scalars().all() if recent else []
+
+    by_bar: dict[str, list] = {}
+    for month in months:
+        by_bar.setdefault(month.bar, []).append(month)
+
+    agents: list[StaffAgentSpan] = []
+    last_span: dict[str, StaffAgentSpan] = {}
+    for month in months:
+        span = last_span.get(month.bar)
+        if span and span.agent_id == month.agent_id_derived and _add_months(span.last_month, 1) == month.month_start:
+            span.last_month = month.month_start
+            continue
+        span = StaffAgentSpan(
+            bar=month.bar,
+            agent_id=month.agent_id_derived,
+            first_month=month.month_start,
+            last_month=month.month_start,
+        )
+        last_span[month.bar] = span
+        agents.append(span)
+
+    return StaffProfileResponse(
+        staff_id=staff_id,
+        lifetime=StaffTotals(**_staff_totals(months)),
+        bars=[
+            StaffBar(bar=bar, **_staff_totals(bar_months))
+            for bar, bar_months in sorted(by_bar.items())
+        ],
+        agents=agents,
+        months=[
+            StaffMonth(
+                month=month.month_start,
+                bar=month.bar,
+                agent_id=month.agent_id_derived,
+                days=month.days,
+                profit=float(month.profit_sum),
+                drinks=float(month.drinks_sum),
+                mismatch_rows=month.mismatch_rows,
+            )
+            for month in months
+        ],
+        recent_rows=[FactRowResponse.model_validate(row) for row in recent_rows],
+    )
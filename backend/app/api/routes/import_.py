@@ -5,6 +5,7 @@ from fastapi import APIRouter, HTTPException, status
 from sqlalchemy import select
 
 from app.api.deps import CurrentUser, DbSession
+from app.api.responses import FastJSONResponse
 from app.models import ImportRun, ImportError as ImportErrorModel, FactRow
 from app.schemas import (
     ImportErrorResponse,
@@ -13,6 +14,11 @@ from app.schemas import (
     MismatchResponse,
 )
 from app.services.import_service import run_import as execute_import
+from app.services.analytics_engine import schedule_engine_refresh
+from app.services.data_version import invalidate_fact_version
+from app.services.payroll_snapshots import invalidate_snapshots
+from app.services.rollup_service import refresh_rollups
+from app.services.row_changes import record_deletions
 
 router = APIRouter(prefix="/import", tags=["import"])
 
@@ -50,6 +56,9 @@ async def run_import(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Import failed: {str(e)}",
         )
+    finally:
+        invalidate_fact_version()
+        schedule_engine_refresh()
 
 
 @router.post("/runs/{run_id}/commit", response_model=ImportRunResponse)
@@ -76,6 +85,9 @@ async def commit_import_run(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Commit failed: {str(e)}",
         )
+    finally:
+        invalidate_fact_version()
+        schedule_engine_refresh()
 
 
 @router.delete("/runs/{run_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -100,13 +112,25 @@ async def delete_import_run(
         )
         
     try:
-        # Manually delete fact rows first (FK constraint)
+        # Days losing rows: rollups and closed payroll months must be recomputed
+        touched_days = (await db.execute(
+            select(FactRow.day)
+            .where(FactRow.last_import_run_id == run_id)
+            .distinct()
+        )).scalars().all()
+        await invalidate_snapshots(db, {day.replace(day=1) for day in touched_days})
+        
+        # Tombstones for delta sync clients, then delete fact rows (FK constraint)
+        await record_deletions(db, FactRow.last_import_run_id == run_id, import_run_id=run_id)
         await db.execute(delete(FactRow).where(FactRow.last_import_run_id == run_id))
+        await refresh_rollups(db, touched_days)
         
         # Delete import run (cascades to errors/raw_rows via model cascade, 
         # but FactRow doesn't have cascade in model def)
         await db.execute(delete(ImportRun).where(ImportRun.id == run_id))
         await db.commit()
+        invalidate_fact_version()
+        schedule_engine_refresh()
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -159,16 +183,17 @@ async def get_import_errors(
     run_id: int,
     limit: int = 100,
     offset: int = 0,
-) -> list[ImportErrorModel]:
+) -> FastJSONResponse:
     """Get errors for a specific import run."""
+    table = ImportErrorModel.__table__
     result = await db.execute(
-        select(ImportErrorModel)
-        .where(ImportErrorModel.import_run_id == run_id)
-        .order_by(ImportErrorModel.sheet_row_number)
+        select(*(table.c[name] for name in ImportErrorResponse.model_fields))
+        .where(table.c.import_run_id == run_id)
+        .order_by(table.c.sheet_row_number)
         .limit(limit)
         .offset(offset)
     )
-    return list(result.scalars().all())
+    return FastJSONResponse([dict(row) for row in result.mappings()])
 
 
 @router.get("/runs/{run_id}/mismatches", response_model=list[MismatchResponse])
@@ -178,19 +203,20 @@ async def get_import_mismatches(
     run_id: int,
     limit: int = 100,
     offset: int = 0,
-) -> list[FactRow]:
+) -> FastJSONResponse:
     """
     Get fact rows with agent mismatch for a specific import run.
     
     A mismatch occurs when the AGENT label from the sheet disagrees
     with agent_id_derived (computed from staff_num_prefix via agent_range_rules).
     """
+    table = FactRow.__table__
     result = await db.execute(
-        select(FactRow)
-        .where(FactRow.last_import_run_id == run_id)
-        .where(FactRow.agent_mismatch == True)
-        .order_by(FactRow.date, FactRow.staff_id)
+        select(*(table.c[name] for name in MismatchResponse.model_fields))
+        .where(table.c.last_import_run_id == run_id)
+        .where(table.c.agent_mismatch == True)
+        .order_by(table.c.date, table.c.staff_id)
         .limit(limit)
         .offset(offset)
     )
-    return list(result.scalars().all())
+    return FastJSONResponse([dict(row) for row in result.mappings()])
@@ -1,188 +1,224 @@
 """
 Data rows routes for table display.
 """
-from fastapi import APIRouter, Query
-from sqlalchemy import func, select, extract, and_, or_
+import asyncio
+import base64
+import binascii
+import json
+from dataclasses import dataclass
 from datetime import datetime
+from decimal import Decimal
+from typing import Any, Literal
+
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Row, func, select, and_, or_, true, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import CurrentUser, DbSession
-from app.models import FactRow
-from app.schemas import FactRowResponse, RowsKPIResponse
+from app.api.filters import RowFilters, RowFiltersDep
+from app.api.payloads import ROW_FIELDS, parse_fields, to_columnar, to_records
+from app.api.responses import FastJSONResponse
+from app.core.db import async_session_factory, estimate_rows
+from app.models import DailyRollup, DailyStaffSketch, FactRow
+from app.schemas import (
+    FacetCount,
+    FactRowResponse,
+    RowChangesResponse,
+    RowFacetsResponse,
+    RowsKPIResponse,
+    RowsPageResponse,
+)
+from app.services.analytics_engine import get_engine
+from app.services.data_version import current_fact_version
+from app.services.hll import RELATIVE_ERROR, approx_distinct_staff
+from app.services.row_changes import fetch_changes
+from app.services.row_export import MEDIA_TYPES, STREAMERS, export_select
 
 router = APIRouter(prefix="/rows", tags=["rows"])
 
-@router.get("", response_model=list[FactRowResponse])
-async def list_rows(
-    db: DbSession,
-    current_user: CurrentUser,
-    # Filters
-    bar: list[str] | None = Query(None),
-    year: list[int] | None = Query(None),
-    month: list[int] | None = Query(None),
-    contract: list[str] | None = Query(None),
-    agent: list[str] | None = Query(None), # Changed to list[str] for composite keys
-    start_date: str | None = None,
-    end_date: str | None = None,
-    staff_search: str | None = None,
-    # Pagination ...
-    cursor: int | None = None,
-    limit: int = 50,
-    # Sorting
-    sort_by: str = "date",
-    sort_order: str = "desc",
-) -> list[FactRow]:
+# Sortable columns; each has a matching (column, id) index for keyset pagination
+SORT_COLUMNS = {
+    "date": FactRow.date,
+    "staff_id": FactRow.staff_id,
+    "profit": FactRow.profit,
+    "drinks": FactRow.drinks,
+    "sale": FactRow.sale,
+    "total": FactRow.total,
+    "id": FactRow.id,
+}
+SortBy = Literal["date", "staff_id", "profit", "drinks", "sale", "total", "id"]
+SortOrder = Literal["asc", "desc"]
+ExportFormat = Literal["csv", "ndjson", "parquet"]
+RowsFormat = Literal["rows", "columnar"]
+
+# Facet -> (grouping columns, filter the facet ignores)
+FACETS = {
+    "bars": ((FactRow.bar,), "bar"),
+    "agents": ((FactRow.bar, FactRow.agent_id_derived), "agent"),
+    "years": ((FactRow.source_year,), "year"),
+    "months": ((FactRow.month,), "month"),
+    "contracts": ((FactRow.contract,), "contract"),
+}
+FACET_CACHE_SIZE = 256
+
+# (data version, filters) -> facets; cleared when the data version changes
+_facet_cache: dict[tuple, RowFacetsResponse] = {}
+
+
+@dataclass
+class RowsPage:
+    """One page of rows plus pagination metadata."""
+    rows: list[Row]
+    next_cursor: str | None = None
+    total_estimate: int | None = None
+    offset_estimate: int | None = None
+
+
+def _encode_cursor(sort_by: str, value: Any, row_id: int) -> str:
+    """Encode the (sort_value, id) position of a row as an opaque cursor."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, Decimal):
+        value = str(value)
+    payload = json.dumps([sort_by, value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort_by: str) -> tuple[Any, int]:
+    """Decode an opaque cursor into (sort_value, id) for the given sort column."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if cursor_sort != sort_by:
+            raise ValueError("cursor sort mismatch")
+        if value is not None:
+            python_type = SORT_COLUMNS[sort_by].type.python_type
+            value = datetime.fromisoformat(value) if python_type is datetime else python_type(value)
+        return value, int(row_id)
+    except (ValueError, TypeError, binascii.Error, ArithmeticError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
+def _parse_sort_value(sort_by: str, raw: str) -> Any:
+    """Parse a query-string value for the given sort column."""
+    python_type = SORT_COLUMNS[sort_by].type.python_type
+    try:
+        return datetime.fromisoformat(raw) if python_type is datetime else python_type(raw)
+    except (ValueError, ArithmeticError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid seek value '{raw}' for sort column {sort_by}",
+        )
+
+
+def _keyset_predicate(sort_col, sort_order: str, value: Any, row_id: int):
     """
-    List fact rows with server-side filtering and pagination.
-    Uses cursor-based pagination for infinite scroll.
-    """
-    query = select(FactRow)
-    
-    # Apply filters
-    # Apply filters
-    if bar:
-        query = query.where(FactRow.bar.in_(bar))
-    
-    # Date Filtering: Prioritize Date Range, fallback to Year/Month
-    if start_date and end_date:
-        try:
-            s_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            e_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            query = query.where(and_(func.date(FactRow.date) >= s_date, func.date(FactRow.date) <= e_date))
-        except ValueError:
-             pass
-    else:
-        if year:
-            query = query.where(FactRow.source_year.in_(year))
-        if month:
-            query = query.where(extract('month', FactRow.date).in_(month))
-    if contract:
-        query = query.where(FactRow.contract.in_(contract))
-    if agent:
-        # Parse composite keys: "BAR|ID"
-        agent_filters = []
-        for key in agent:
-            try:
-                if "|" not in key:
-                    continue # Skip invalid format
-                    
-                target_bar, target_id_str = key.split("|")
-                
-                if target_id_str == "0" or target_id_str == "NULL":
-                     # Handle "House Agent" (No Agent)
-                     agent_filters.append(and_(
-                         FactRow.bar == target_bar,
-                         FactRow.agent_id_derived.is_(None)
-                     ))
-                else:
-                    agent_filters.append(and_(
-                        FactRow.bar == target_bar,
-                        FactRow.agent_id_derived == int(target_id_str)
-                    ))
-            except ValueError:
-                continue
-                
-        if agent_filters:
-            query = query.where(or_(*agent_filters))
-            
-    if staff_search:
-        query = query.where(FactRow.staff_id.ilike(f"%{staff_search}%"))
-    
-    # Cursor-based pagination
-    # Cursor-based pagination
+    Rows strictly after (value, row_id) in the page order.
+    NULL sort values follow Postgres defaults: last in asc, first in desc.
+    """
+    if sort_order == "asc":
+        if value is None:
+            return and_(sort_col.is_(None), FactRow.id > row_id)
+        return or_(tuple_(sort_col, FactRow.id) > tuple_(value, row_id), sort_col.is_(None))
+    if value is None:
+        return or_(and_(sort_col.is_(None), FactRow.id < row_id), sort_col.is_not(None))
+    return tuple_(sort_col, FactRow.id) < tuple_(value, row_id)
+
+
+async def _fetch_page(
+    db: AsyncSession,
+    filters: RowFilters,
+    cursor: str | None,
+    seek: str | None,
+    limit: int,
+    sort_by: str,
+    sort_order: str,
+    fields: list[str],
+) -> RowsPage:
+    """
+    Fetch one keyset page of filtered rows (see list_rows).
+    Only `fields` (plus id and the sort column) are selected, with a Core
+    select: rows are Row tuples, not ORM entities.
+    """
+    sort_col = SORT_COLUMNS[sort_by]
+    selected = dict.fromkeys([*fields, "id", sort_by])
+    filtered = filters.apply(select(*(getattr(FactRow, name) for name in selected)))
+    query = filtered
+    
+    # Keyset pagination on (sort_col, id)
     if cursor:
-        if sort_order == "desc":
-            query = query.where(FactRow.id < cursor)
+        if cursor.isdigit():
+            # Legacy cursor: id of the last row seen
+            cursor_id = int(cursor)
+            result = await db.execute(select(sort_col).where(FactRow.id == cursor_id))
+            cursor_row = result.one_or_none()
+            if cursor_row is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid cursor",
+                )
+            cursor_value = cursor_row[0]
         else:
-            query = query.where(FactRow.id > cursor)
+            cursor_value, cursor_id = _decode_cursor(cursor, sort_by)
+        query = query.where(_keyset_predicate(sort_col, sort_order, cursor_value, cursor_id))
+    elif seek:
+        # Plain range (not a row comparison) so the planner estimate uses the column histogram
+        seek_value = _parse_sort_value(sort_by, seek)
+        if sort_order == "asc":
+            query = query.where(or_(sort_col >= seek_value, sort_col.is_(None)))
+        else:
+            query = query.where(sort_col <= seek_value)
+    
+    page = RowsPage(rows=[])
+    if not cursor:
+        page.total_estimate = await estimate_rows(db, filtered)
+        if seek:
+            remaining_estimate = await estimate_rows(db, query)
+            page.offset_estimate = max(0, page.total_estimate - remaining_estimate)
     
     # Sorting
     if sort_order == "asc":
-        query = query.order_by(getattr(FactRow, sort_by).asc(), FactRow.id.asc())
+        query = query.order_by(sort_col.asc(), FactRow.id.asc())
     else:
-        query = query.order_by(getattr(FactRow, sort_by).desc(), FactRow.id.desc())
+        query = query.order_by(sort_col.desc(), FactRow.id.desc())
     
     # Limit
     query = query.limit(limit)
     
     # Execute
     result = await db.execute(query)
-    rows = list(result.scalars().all())
+    page.rows = list(result.all())
     
-    return rows
+    if len(page.rows) == limit:
+        last = page.rows[-1]
+        page.next_cursor = _encode_cursor(sort_by, getattr(last, sort_col.key), last.id)
+    
+    return page
 
 
-@router.get("/kpis", response_model=RowsKPIResponse)
-async def get_kpis(
-    db: DbSession,
-    current_user: CurrentUser,
-    # Same filters as list_rows
-    bar: list[str] | None = Query(None),
-    year: list[int] | None = Query(None),
-    month: list[int] | None = Query(None),
-    contract: list[str] | None = Query(None),
-    agent: list[str] | None = Query(None),
-    start_date: str | None = None,
-    end_date: str | None = None,
-    staff_search: str | None = None,
-) -> RowsKPIResponse:
-    """Get KPIs for filtered fact rows."""
-    # Build aggregation query
-    query = select(
+async def _fetch_kpis(db: AsyncSession, filters: RowFilters, approx: bool = False) -> RowsKPIResponse:
+    """
+    Aggregate KPIs over the filtered rows.
+    With `approx`, totals come from daily rollups and unique_staff from
+    HLL sketches when the filters allow it (no contract or staff search).
+    """
+    engine = await get_engine()
+    if engine is not None:
+        return RowsKPIResponse(**engine.kpis(filters))
+    if approx and filters.supports(DailyStaffSketch):
+        return await _fetch_approx_kpis(db, filters)
+    
+    query = filters.apply(select(
         func.count(FactRow.id).label('total_rows'),
         func.sum(FactRow.profit).label('total_profit'),
         func.sum(FactRow.drinks).label('total_drinks'),
         func.avg(FactRow.profit).label('avg_profit'),
-        func.count(func.distinct(FactRow.staff_id)).label('unique_staff'),
-    )
-    
-    # Apply same filters
-    # Apply same filters
-    if bar:
-        query = query.where(FactRow.bar.in_(bar))
-    
-    # Date Filtering: Prioritize Date Range, fallback to Year/Month
-    if start_date and end_date:
-        try:
-            s_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            e_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            query = query.where(and_(func.date(FactRow.date) >= s_date, func.date(FactRow.date) <= e_date))
-        except ValueError:
-             pass
-    else:
-        if year:
-            query = query.where(FactRow.source_year.in_(year))
-        if month:
-            query = query.where(extract('month', FactRow.date).in_(month))
-    if contract:
-         query = query.where(FactRow.contract.in_(contract))
-    if agent:
-        # Parse composite keys: "BAR|ID"
-        agent_filters = []
-        for key in agent:
-            try:
-                if "|" not in key:
-                    continue
-                    
-                target_bar, target_id_str = key.split("|")
-                
-                if target_id_str == "0" or target_id_str == "NULL":
-                     agent_filters.append(and_(
-                         FactRow.bar == target_bar,
-                         FactRow.agent_id_derived.is_(None)
-                     ))
-                else:
-                    agent_filters.append(and_(
-                        FactRow.bar == target_bar,
-                        FactRow.agent_id_derived == int(target_id_str)
-                    ))
-            except ValueError:
-                continue
-                
-        if agent_filters:
-            query = query.where(or_(*agent_filters))
-            
-    if staff_search:
-        query = query.where(FactRow.staff_id.ilike(f"%{staff_search}%"))
+        func.count(func.distinct(FactRow.staff_key)).label('unique_staff'),
+    ))
     
     result = await db.execute(query)
     row = result.one()
@@ -196,6 +232,238 @@ async def get_kpis(
     )
 
 
+async def _fetch_approx_kpis(db: AsyncSession, filters: RowFilters) -> RowsKPIResponse:
+    query = filters.apply(select(
+        func.sum(DailyRollup.rows).label('total_rows'),
+        func.sum(DailyRollup.profit_sum).label('total_profit'),
+        func.sum(DailyRollup.drinks_sum).label('total_drinks'),
+        (func.sum(DailyRollup.profit_sum) / func.nullif(func.sum(DailyRollup.profit_count), 0)).label('avg_profit'),
+    ), model=DailyRollup)
+    row = (await db.execute(query)).one()
+    unique_staff = await approx_distinct_staff(db, filters.conditions(model=DailyStaffSketch))
+    
+    return RowsKPIResponse(
+        total_rows=row.total_rows or 0,
+        total_profit=float(row.total_profit or 0),
+        total_drinks=float(row.total_drinks or 0),
+        avg_profit=float(row.avg_profit or 0),
+        unique_staff=unique_staff[()],
+        unique_staff_error=RELATIVE_ERROR,
+    )
+
+
+async def _fetch_facets(db: AsyncSession, filters: RowFilters, data_version: str) -> RowFacetsResponse:
+    """
+    All facet counts in one GROUPING SETS query.
+    Each facet has its own count column, filtered by every condition except
+    the facet's own; GROUPING() tells which set a result row belongs to.
+    """
+    grouping_columns = list(dict.fromkeys(col for cols, _ in FACETS.values() for col in cols))
+    width = len(grouping_columns)
+    masks = {}
+    for name, (cols, _) in FACETS.items():
+        # GROUPING() sets a bit (first argument = highest) per column not in the set
+        masks[sum(1 << (width - 1 - i) for i, col in enumerate(grouping_columns) if col not in cols)] = name
+    
+    scopes = {}
+    for name, (_, own_filter) in FACETS.items():
+        conditions = filters.conditions(exclude=(own_filter,))
+        scopes[name] = and_(*conditions) if conditions else true()
+    
+    query = select(
+        *grouping_columns,
+        func.grouping(*grouping_columns).label("grouping_id"),
+        *(func.count().filter(scope).label(name) for name, scope in scopes.items()),
+    ).group_by(func.grouping_sets(*(tuple_(*cols) for cols, _ in FACETS.values())))
+    if filters.conditions():
+        # Rows that count for at least one facet
+        query = query.where(or_(*scopes.values()))
+    
+    result = await db.execute(query)
+    
+    found: dict[str, list[tuple[Any, Any, int]]] = {name: [] for name in FACETS}
+    for row in result:
+        name = masks[row.grouping_id]
+        count = getattr(row, name)
+        if not count:
+            continue
+        if name == "agents":
+            found[name].append(((row.bar, row.agent_id_derived is None, row.agent_id_derived or 0),
+                                f"{row.bar}|{row.agent_id_derived or 'NULL'}", count))
+        else:
+            value = getattr(row, FACETS[name][0][0].key)
+            if value is None:
+                continue  # NULL contracts cannot be selected with the contract filter
+            found[name].append((value, value, count))
+    
+    return RowFacetsResponse(
+        **{
+            name: [FacetCount(value=value, count=count) for _, value, count in sorted(items, key=lambda item: item[0])]
+            for name, items in found.items()
+        },
+        data_version=data_version,
+    )
+
+
+async def _in_own_session(fn, *args):
+    """Run fn(session, *args) on its own pooled connection."""
+    async with async_session_factory() as session:
+        return await fn(session, *args)
+
+
+@router.get("", response_model=list[FactRowResponse])
+async def list_rows(
+    db: DbSession,
+    current_user: CurrentUser,
+    filters: RowFiltersDep,
+    # Pagination ...
+    cursor: str | None = None,
+    seek: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    # Sorting
+    sort_by: SortBy = "date",
+    sort_order: SortOrder = "desc",
+    # Payload shape
+    fields: list[str] | None = Query(None),
+    format: RowsFormat = "rows",
+) -> FastJSONResponse:
+    """
+    List fact rows with server-side filtering and pagination.
+    Uses keyset pagination for infinite scroll: pass the X-Next-Cursor
+    header of the previous page as `cursor`. A plain row id is also
+    accepted as cursor (position of that row).
+    
+    `seek` jumps to a sort-key value (e.g. seek=2025-06-01 when sorting by
+    date): the page starts at the first row at or past that value. The
+    first page and seek pages carry X-Total-Estimate (and X-Offset-Estimate
+    for seeks), planner estimates used for scrollbar sizing.
+    
+    `fields` (e.g. fields=date,bar,staff_id,profit) selects only those
+    columns in SQL. `format=columnar` returns one array per column, with
+    bar/contract/position/agent_label dictionary-encoded.
+    """
+    # Always a Core select: rows are serialized straight to JSON, never as ORM entities
+    projection = parse_fields(fields) or ROW_FIELDS
+    page = await _fetch_page(db, filters, cursor, seek, limit, sort_by, sort_order, projection)
+    
+    headers = {}
+    if page.next_cursor:
+        headers["X-Next-Cursor"] = page.next_cursor
+    if page.total_estimate is not None:
+        headers["X-Total-Estimate"] = str(page.total_estimate)
+    if page.offset_estimate is not None:
+        headers["X-Offset-Estimate"] = str(page.offset_estimate)
+    
+    if format == "columnar":
+        return FastJSONResponse(to_columnar(page.rows, projection), headers=headers)
+    return FastJSONResponse(to_records(page.rows, projection), headers=headers)
+
+
+@router.get("/kpis", response_model=RowsKPIResponse)
+async def get_kpis(
+    db: DbSession,
+    current_user: CurrentUser,
+    filters: RowFiltersDep,
+    approx: bool = False,
+) -> RowsKPIResponse:
+    """
+    Get KPIs for filtered fact rows.
+    approx=true estimates unique_staff from sketches (see unique_staff_error).
+    """
+    return await _fetch_kpis(db, filters, approx)
+
+
+@router.get("/page", response_model=RowsPageResponse)
+async def get_page(
+    current_user: CurrentUser,
+    filters: RowFiltersDep,
+    cursor: str | None = None,
+    seek: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    sort_by: SortBy = "date",
+    sort_order: SortOrder = "desc",
+) -> FastJSONResponse:
+    """
+    Rows page and KPI block for the same filters in one round trip.
+    Both queries run concurrently, each on its own pooled connection.
+    """
+    page, kpis = await asyncio.gather(
+        _in_own_session(_fetch_page, filters, cursor, seek, limit, sort_by, sort_order, ROW_FIELDS),
+        _in_own_session(_fetch_kpis, filters),
+    )
+    
+    return FastJSONResponse({
+        "rows": to_records(page.rows, ROW_FIELDS),
+        "kpis": kpis.model_dump(),
+        "next_cursor": page.next_cursor,
+        "total_estimate": page.total_estimate,
+        "offset_estimate": page.offset_estimate,
+    })
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_rows(
+    current_user: CurrentUser,
+    filters: RowFiltersDep,
+    format: ExportFormat = "csv",
+) -> StreamingResponse:
+    """
+    Stream all filtered rows as CSV, NDJSON or Parquet.
+    Uses a server-side cursor: output starts immediately and memory stays flat.
+    """
+    query = filters.apply(export_select())
+    return StreamingResponse(
+        STREAMERS[format](query),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="fact_rows.{format}"'},
+    )
+
+
+@router.get("/facets", response_model=RowFacetsResponse)
+async def get_facets(
+    db: DbSession,
+    current_user: CurrentUser,
+    filters: RowFiltersDep,
+) -> RowFacetsResponse:
+    """
+    Bars, agents, years, months and contracts with row counts for the
+    current filters, each facet ignoring its own filter (so other values
+    of the same facet stay selectable). Cached per fact version.
+    """
+    data_version = await current_fact_version()
+    key = (data_version, filters.cache_key())
+    facets = _facet_cache.get(key)
+    if facets is None:
+        facets = await _fetch_facets(db, filters, data_version)
+        if any(cached_version != data_version for cached_version, _ in _facet_cache):
+            _facet_cache.clear()
+        elif len(_facet_cache) >= FACET_CACHE_SIZE:
+            _facet_cache.pop(next(iter(_facet_cache)))
+        _facet_cache[key] = facets
+    return facets
+
+
+@router.get("/changes", response_model=RowChangesResponse)
+async def get_changes(
+    db: DbSession,
+    current_user: CurrentUser,
+    since: int = Query(0, ge=0),
+    limit: int = Query(5000, ge=1, le=50000),
+) -> FastJSONResponse:
+    """
+    Rows inserted, updated or deleted after change version `since`.
+    since=0 returns every row. Pass the returned `version` as `since` on
+    the next call; repeat while `has_more` is true. Deleted rows come as ids.
+    """
+    changes = await fetch_changes(db, since, limit, ROW_FIELDS)
+    return FastJSONResponse({
+        "version": changes.version,
+        "has_more": changes.has_more,
+        "upserts": to_records(changes.upserts, ROW_FIELDS),
+        "deleted": changes.deleted,
+    })
+
+
 @router.get("/{row_id}", response_model=FactRowResponse)
 async def get_row(
     db: DbSession,
@@ -0,0 +1,32 @@
+"""Search API routes - typeahead suggestions."""
+from typing import Literal
+
+from fastapi import APIRouter, Query
+
+from app.api.deps import CurrentUser
+from app.schemas import SuggestionResponse, SuggestResponse
+from app.services.suggest_index import get_suggest_index
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.get("/suggest", response_model=SuggestResponse)
+async def suggest(
+    current_user: CurrentUser,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    kind: list[Literal["staff", "agent", "bar"]] | None = Query(None),
+):
+    """
+    Staff, agent and bar suggestions for a typed prefix, from the in-process
+    index (no database query). Matches staff ids ("046 - NICK"), staff
+    numbers ("46"), nickname tokens, agent keys/labels and bar names.
+    """
+    index = await get_suggest_index()
+    return SuggestResponse(
+        suggestions=[
+            SuggestionResponse.model_validate(s)
+            for s in index.suggest(q, limit, kind)
+        ],
+        data_version=index.version,
+    )
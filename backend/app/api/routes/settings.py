@@ -1,20 +1,23 @@
 """
-Settings routes for data source and agent range configuration.
+Settings routes for data source, agent range and bonus rule configuration.
 """
 from fastapi import APIRouter, HTTPException, status
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from sqlalchemy import select
+from sqlalchemy import select, update
 
 from app.api.deps import CurrentAdmin, CurrentUser, DbSession
 from app.core.config import get_settings
-from app.models import AgentRangeRule, DataSource
+from app.models import AgentRangeRule, BonusRuleSet, DataSource
 from app.schemas import (
     AgentRangeRuleCreate,
     AgentRangeRuleResponse,
+    BonusRuleSetCreate,
+    BonusRuleSetResponse,
     DataSourceCreate,
     DataSourceResponse,
 )
+from app.services.data_version import invalidate_data_version, invalidate_fact_version
 
 router = APIRouter(prefix="/settings", tags=["settings"])
 
@@ -237,6 +240,7 @@ async def create_agent_rule(
     rule = AgentRangeRule(**data.model_dump())
     db.add(rule)
     await db.commit()
+    invalidate_fact_version()
     await db.refresh(rule)
     return rule
 
@@ -261,4 +265,111 @@ async def delete_agent_rule(
     
     await db.delete(rule)
     await db.commit()
+    invalidate_fact_version()
     return {"status": "deleted", "id": rule_id}
+
+
+# --- Bonus Rule Sets ---
+# Rules only affect payroll responses, never fact-derived caches: writes
+# below bump the data (ETag) version, not the fact version.
+
+async def _get_bonus_rule_set(db: DbSession, rule_set_id: int) -> BonusRuleSet:
+    result = await db.execute(
+        select(BonusRuleSet).where(BonusRuleSet.id == rule_set_id)
+    )
+    rule_set = result.scalar_one_or_none()
+    if not rule_set:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bonus rule set not found",
+        )
+    return rule_set
+
+
+@router.get("/bonus-rules", response_model=list[BonusRuleSetResponse])
+async def list_bonus_rule_sets(
+    db: DbSession,
+    current_user: CurrentUser,
+) -> list[BonusRuleSet]:
+    """List bonus rule sets. Without an active set, payroll uses the defaults."""
+    result = await db.execute(select(BonusRuleSet).order_by(BonusRuleSet.name))
+    return list(result.scalars().all())
+
+
+@router.post("/bonus-rules", response_model=BonusRuleSetResponse)
+async def create_bonus_rule_set(
+    db: DbSession,
+    current_user: CurrentAdmin,
+    data: BonusRuleSetCreate,
+) -> BonusRuleSet:
+    """Create an inactive bonus rule set."""
+    existing = await db.execute(
+        select(BonusRuleSet).where(BonusRuleSet.name == data.name)
+    )
+    if existing.scalar_one_or_none():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Bonus rule set '{data.name}' already exists",
+        )
+    
+    rule_set = BonusRuleSet(**data.model_dump(), is_active=False)
+    db.add(rule_set)
+    await db.commit()
+    invalidate_data_version()
+    await db.refresh(rule_set)
+    return rule_set
+
+
+@router.put("/bonus-rules/{rule_set_id}", response_model=BonusRuleSetResponse)
+async def update_bonus_rule_set(
+    db: DbSession,
+    current_user: CurrentAdmin,
+    rule_set_id: int,
+    data: BonusRuleSetCreate,
+) -> BonusRuleSet:
+    """Update a bonus rule set."""
+    rule_set = await _get_bonus_rule_set(db, rule_set_id)
+    for field, value in data.model_dump().items():
+        setattr(rule_set, field, value)
+    
+    await db.commit()
+    invalidate_data_version()
+    await db.refresh(rule_set)
+    return rule_set
+
+
+@router.post("/bonus-rules/{rule_set_id}/activate", response_model=BonusRuleSetResponse)
+async def activate_bonus_rule_set(
+    db: DbSession,
+    current_user: CurrentAdmin,
+    rule_set_id: int,
+) -> BonusRuleSet:
+    """Make a rule set the one payroll uses (closed months keep their snapshot)."""
+    # Lock every rule set so concurrent activations run one after the other
+    await db.execute(select(BonusRuleSet.id).with_for_update())
+    rule_set = await _get_bonus_rule_set(db, rule_set_id)
+    await db.execute(
+        update(BonusRuleSet)
+        .where(BonusRuleSet.id != rule_set_id, BonusRuleSet.is_active.is_(True))
+        .values(is_active=False)
+    )
+    rule_set.is_active = True
+    
+    await db.commit()
+    invalidate_data_version()
+    await db.refresh(rule_set)
+    return rule_set
+
+
+@router.delete("/bonus-rules/{rule_set_id}")
+async def delete_bonus_rule_set(
+    db: DbSession,
+    current_user: CurrentAdmin,
+    rule_set_id: int,
+) -> dict:
+    """Delete a bonus rule set; deleting the active one reverts payroll to the defaults."""
+    rule_set = await _get_bonus_rule_set(db, rule_set_id)
+    await db.delete(rule_set)
+    await db.commit()
+    invalidate_data_version()
+    return {"status": "deleted", "id": rule_set_id}
@@ -24,6 +24,14 @@ class Settings(BaseSettings):
     access_token_expire_minutes: int = 30
     refresh_token_expire_days: int = 7
     
+    # Caching: how long a worker trusts its cached data version
+    data_version_ttl_seconds: float = 5.0
+    
+    # Answer KPI/leaderboard/payroll aggregates from in-memory NumPy arrays
+    analytics_engine_enabled: bool = False
+    # Arrow snapshots of the engine's columns shared by workers ("" disables)
+    fact_snapshot_dir: str = "./snapshots"
+    
     # Google Sheets
     google_credentials_path: str = "./credentials.json"
     
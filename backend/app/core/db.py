@@ -1,6 +1,7 @@
 """
 Async database session management.
 """
+import json
 from collections.abc import AsyncGenerator
 
 from sqlalchemy.ext.asyncio import (
@@ -8,6 +9,8 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
 
 from app.core.config import get_settings
 
@@ -36,3 +39,28 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         except Exception:
             await session.rollback()
             raise
+
+
+class _ExplainJson(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) wrapper that keeps the statement's bind parameters."""
+    inherit_cache = False
+    
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_ExplainJson, "postgresql")
+def _compile_explain_json(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+async def estimate_rows(db: AsyncSession, statement) -> int:
+    """
+    Planner row estimate for a SELECT, from table statistics.
+    Costs a planning pass only; use instead of count(*) where approximate is fine.
+    """
+    result = await db.execute(_ExplainJson(statement))
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
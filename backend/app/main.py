@@ -6,9 +6,11 @@ from pathlib import Path
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from app.api import auth_router, import_router, rows_router, settings_router, users_router, analytics_router
+from app.api import auth_router, import_router, rows_router, settings_router, users_router, analytics_router, search_router
+from app.api.etag import ConditionalGetMiddleware
 from app.core.config import get_settings
 
 settings = get_settings()
@@ -38,6 +40,10 @@ if settings.is_development:
         allow_headers=["*"],
     )
 
+# Conditional GET (ETag / 304) for read endpoints, then compression
+app.add_middleware(ConditionalGetMiddleware)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # API routes
 app.include_router(auth_router, prefix="/api")
 app.include_router(import_router, prefix="/api")
@@ -45,6 +51,7 @@ app.include_router(rows_router, prefix="/api")
 app.include_router(settings_router, prefix="/api")
 app.include_router(users_router, prefix="/api")
 app.include_router(analytics_router, prefix="/api")
+app.include_router(search_router, prefix="/api")
 
 
 @app.get("/api/health")
@@ -8,10 +8,17 @@ from app.models.base import (
     RefreshToken,
     ImportRun,
     RawRow,
+    Staff,
     FactRow,
+    FactRowTombstone,
     ImportError,
     AgentRangeRule,
+    BonusRuleSet,
     DataSource,
+    PayrollSnapshot,
+    DailyRollup,
+    DailyStaffSketch,
+    StaffMonthlyActivity,
 )
 
 __all__ = [
@@ -23,8 +30,15 @@ __all__ = [
     "RefreshToken",
     "ImportRun",
     "RawRow",
+    "Staff",
     "FactRow",
+    "FactRowTombstone",
     "ImportError",
     "AgentRangeRule",
+    "BonusRuleSet",
     "DataSource",
+    "PayrollSnapshot",
+    "DailyRollup",
+    "DailyStaffSketch",
+    "StaffMonthlyActivity",
 ]
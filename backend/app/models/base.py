@@ -2,20 +2,27 @@
 SQLAlchemy models for Digital Shadow.
 """
 import enum
-from datetime import datetime
+from datetime import date, datetime
 from typing import Any
 
 from sqlalchemy import (
+    ARRAY,
+    BigInteger,
     Boolean,
+    Computed,
+    Date,
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     JSON,
     Numeric,
+    Sequence,
     String,
     Text,
     func,
+    text,
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -25,6 +32,10 @@ class Base(DeclarativeBase):
     pass
 
 
+# Change sequence shared by fact_rows and their tombstones (delta sync cursor)
+FACT_ROW_CHANGE_SEQ = Sequence("fact_row_change_seq", metadata=Base.metadata)
+
+
 class UserRole(str, enum.Enum):
     """User role enumeration."""
     ADMIN = "admin"
@@ -117,9 +128,46 @@ class RawRow(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
 
 
+class Staff(Base):
+    """
+    Staff dimension: one row per distinct staff_id, inserted on first import.
+    Fact rows reference it by integer key so group-bys and distinct counts
+    compare integers instead of text.
+    """
+    __tablename__ = "staff"
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    staff_id: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
+    staff_num_prefix: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+
 class FactRow(Base):
     """Business fact table with derived fields."""
     __tablename__ = "fact_rows"
+    __table_args__ = (
+        Index("ix_fact_rows_bar_date", "bar", "date"),
+        Index("ix_fact_rows_bar_agent_date", "bar", "agent_id_derived", "date"),
+        Index("ix_fact_rows_staff_date", "staff_id", "date"),
+        Index("ix_fact_rows_staff_key_date", "staff_key", "date"),
+        # Substring staff search (ILIKE '%term%'), needs the pg_trgm extension
+        Index(
+            "ix_fact_rows_staff_id_trgm",
+            "staff_id",
+            postgresql_using="gin",
+            postgresql_ops={"staff_id": "gin_trgm_ops"},
+        ),
+        Index("ix_fact_rows_source_year_month", "source_year", "month"),
+        # Keyset pagination indexes, one per sortable column of /rows
+        Index("ix_fact_rows_date_id", "date", "id"),
+        Index("ix_fact_rows_staff_id_id", "staff_id", "id"),
+        Index("ix_fact_rows_profit_id", "profit", "id"),
+        Index("ix_fact_rows_drinks_id", "drinks", "id"),
+        Index("ix_fact_rows_sale_id", "sale", "id"),
+        Index("ix_fact_rows_total_id", "total", "id"),
+        Index("ix_fact_rows_last_import_run_id", "last_import_run_id"),
+        Index("ix_fact_rows_change_seq", "change_seq", unique=True),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     business_key: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)  # sha256(bar|date|staff_id)
@@ -132,8 +180,15 @@ class FactRow(Base):
     # Core fields from sheet (A->Q)
     bar: Mapped[str] = mapped_column(String(50), nullable=False)
     date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    
+    # Generated calendar columns (filter on these instead of extract()/date())
+    year: Mapped[int] = mapped_column(Integer, Computed("CAST(EXTRACT(YEAR FROM date) AS INTEGER)", persisted=True))
+    month: Mapped[int] = mapped_column(Integer, Computed("CAST(EXTRACT(MONTH FROM date) AS INTEGER)", persisted=True))
+    day: Mapped["date"] = mapped_column(Date, Computed("CAST(date AS DATE)", persisted=True))
+    
     agent_label: Mapped[str | None] = mapped_column(String(50), nullable=True)  # From sheet AGENT column
     staff_id: Mapped[str] = mapped_column(String(100), nullable=False)  # Atomic: "NNN - NICKNAME"
+    staff_key: Mapped[int] = mapped_column(ForeignKey("staff.id"), nullable=False)  # Staff dimension id, for grouping
     position: Mapped[str | None] = mapped_column(String(50), nullable=True)
     salary: Mapped[float | None] = mapped_column(Numeric(10, 2), nullable=True)
     start_time: Mapped[str | None] = mapped_column(String(20), nullable=True)
@@ -156,6 +211,26 @@ class FactRow(Base):
     # Timestamps
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    # Bumped on every insert/update; see FactRowTombstone
+    change_seq: Mapped[int] = mapped_column(
+        BigInteger,
+        FACT_ROW_CHANGE_SEQ,
+        server_default=FACT_ROW_CHANGE_SEQ.next_value(),
+        onupdate=FACT_ROW_CHANGE_SEQ.next_value(),
+        nullable=False,
+    )
+
+
+class FactRowTombstone(Base):
+    """Deleted fact row, kept so delta sync clients can drop it."""
+    __tablename__ = "fact_row_tombstones"
+    
+    change_seq: Mapped[int] = mapped_column(BigInteger, FACT_ROW_CHANGE_SEQ, primary_key=True)
+    fact_row_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    business_key: Mapped[str] = mapped_column(String(64), nullable=False)
+    import_run_id: Mapped[int | None] = mapped_column(Integer, nullable=True)  # Run whose deletion removed the row
+    deleted_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
 
 
 class ImportError(Base):
@@ -174,6 +249,115 @@ class ImportError(Base):
     import_run: Mapped["ImportRun"] = relationship(back_populates="errors")
 
 
+# --- Payroll Models ---
+
+class PayrollSnapshot(Base):
+    """Frozen month-end payroll for a (month, bar); bar NULL means all bars."""
+    __tablename__ = "payroll_snapshots"
+    __table_args__ = (
+        # One snapshot per scope; NULL (all bars) must collide with itself
+        Index("ix_payroll_snapshots_month_bar", "month", text("coalesce(bar, '')"), unique=True),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    month: Mapped[date] = mapped_column(Date, nullable=False)  # First day of the month
+    bar: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    data_version: Mapped[str] = mapped_column(String(64), nullable=False)  # Data version at close time
+    agents: Mapped[list[dict[str, Any]]] = mapped_column(JSON, nullable=False)  # Serialized AgentPayroll rows
+    closed_by_id: Mapped[int | None] = mapped_column(ForeignKey("app_users.id", ondelete="SET NULL"), nullable=True)
+    closed_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    invalidated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # Set when an import touches the month
+
+
+# --- Rollup Models ---
+
+class DailyRollup(Base):
+    """
+    Fact rows pre-aggregated per (date, bar, agent, contract, position).
+    Refreshed for the touched days whenever fact rows change.
+    """
+    __tablename__ = "daily_rollups"
+    __table_args__ = (
+        Index("ix_daily_rollups_date", "date"),
+        Index("ix_daily_rollups_bar_date", "bar", "date"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    
+    # Grain (same names as FactRow so the shared row filters apply)
+    date: Mapped[date] = mapped_column(Date, nullable=False)
+    source_year: Mapped[int] = mapped_column(Integer, nullable=False)
+    month: Mapped[int] = mapped_column(Integer, nullable=False)
+    bar: Mapped[str] = mapped_column(String(50), nullable=False)
+    agent_id_derived: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    contract: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    position: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    
+    # Additive measures; *_count is the number of non-NULL values (for averages)
+    rows: Mapped[int] = mapped_column(Integer, nullable=False)
+    staff_count: Mapped[int] = mapped_column(Integer, nullable=False)  # Distinct staff in the group that day
+    profit_sum: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False)
+    profit_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    drinks_sum: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False)
+    drinks_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    sale_sum: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False)
+    sale_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    total_sum: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False)
+    total_count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class DailyStaffSketch(Base):
+    """
+    HyperLogLog sketch of the staff working per (date, bar, agent).
+    Merged across any rows to estimate distinct staff (see services.hll);
+    refreshed together with the daily rollups.
+    """
+    __tablename__ = "daily_staff_sketches"
+    __table_args__ = (
+        Index("ix_daily_staff_sketches_date", "date"),
+        Index("ix_daily_staff_sketches_bar_agent_date", "bar", "agent_id_derived", "date"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    
+    # Grain (same names as FactRow so the shared row filters apply)
+    date: Mapped[date] = mapped_column(Date, nullable=False)
+    source_year: Mapped[int] = mapped_column(Integer, nullable=False)
+    month: Mapped[int] = mapped_column(Integer, nullable=False)
+    bar: Mapped[str] = mapped_column(String(50), nullable=False)
+    agent_id_derived: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    
+    # Sparse registers: register << 6 | rank, one entry per distinct pair
+    registers: Mapped[list[int]] = mapped_column(ARRAY(Integer), nullable=False)
+
+
+class StaffMonthlyActivity(Base):
+    """
+    One row per staff, bar and calendar month worked, with the first and
+    last day seen in that month. Cohort and churn series and staff profiles
+    are derived from it; refreshed with the daily rollups for the touched
+    months.
+    """
+    __tablename__ = "staff_monthly_activity"
+    __table_args__ = (
+        Index("ix_staff_monthly_activity_bar_staff_month", "bar", "staff_id", "month_start", unique=True),
+        Index("ix_staff_monthly_activity_month_start", "month_start"),
+        Index("ix_staff_monthly_activity_staff_month", "staff_id", "month_start"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    month_start: Mapped[date] = mapped_column(Date, nullable=False)  # First day of the month
+    bar: Mapped[str] = mapped_column(String(50), nullable=False)
+    staff_id: Mapped[str] = mapped_column(String(100), nullable=False)
+    agent_id_derived: Mapped[int | None] = mapped_column(Integer, nullable=True)  # Agent in that month
+    first_seen: Mapped[date] = mapped_column(Date, nullable=False)
+    last_seen: Mapped[date] = mapped_column(Date, nullable=False)
+    days: Mapped[int] = mapped_column(Integer, nullable=False)
+    profit_sum: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False)
+    drinks_sum: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False)
+    mismatch_rows: Mapped[int] = mapped_column(Integer, nullable=False)  # Rows with agent_mismatch
+
+
 # --- Configuration Models ---
 
 class AgentRangeRule(Base):
@@ -189,6 +373,29 @@ class AgentRangeRule(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
 
 
+class BonusRuleSet(Base):
+    """
+    Payroll bonus rules: A (volume), B (quality), C (consistency tiers).
+    The active set drives /analytics/payroll; others can be simulated.
+    """
+    __tablename__ = "bonus_rule_sets"
+    __table_args__ = (
+        # At most one active rule set
+        Index("ix_bonus_rule_sets_single_active", text("(true)"), unique=True, postgresql_where=text("is_active")),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
+    is_active: Mapped[bool] = mapped_column(Boolean, default=False)
+    a_min_staff: Mapped[int] = mapped_column(Integer, nullable=False)  # Daily staff needed to unlock Bonus A
+    a_per_staff: Mapped[int] = mapped_column(Integer, nullable=False)  # THB per staff on qualifying days
+    b_min_profit: Mapped[int] = mapped_column(Integer, nullable=False)  # Profit a staff must reach for Bonus B
+    b_per_staff: Mapped[int] = mapped_column(Integer, nullable=False)  # THB per high performer
+    c_tiers: Mapped[list[dict[str, Any]]] = mapped_column(JSON, nullable=False)  # [{"min_avg_staff": 40, "amount": 40000}, ...]
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
 class DataSource(Base):
     """Google Sheets data source configuration."""
     __tablename__ = "data_sources"
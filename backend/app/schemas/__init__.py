@@ -144,6 +144,57 @@ class RowsKPIResponse(BaseModel):
     total_drinks: float
     avg_profit: float
     unique_staff: int
+    # Relative standard error when unique_staff is a sketch estimate
+    unique_staff_error: float | None = None
+
+
+class RowsPageResponse(BaseModel):
+    """Rows page and KPIs for the same filters."""
+    rows: list[FactRowResponse]
+    kpis: RowsKPIResponse
+    next_cursor: str | None
+    total_estimate: int | None
+    offset_estimate: int | None
+
+
+class FacetCount(BaseModel):
+    value: str | int  # Filter value as accepted by /rows (agents as "BAR|ID", "BAR|NULL" for house)
+    count: int
+
+
+class RowFacetsResponse(BaseModel):
+    """Filter values with row counts; each facet ignores its own filter."""
+    bars: list[FacetCount]
+    agents: list[FacetCount]
+    years: list[FacetCount]
+    months: list[FacetCount]
+    contracts: list[FacetCount]
+    data_version: str
+
+
+class RowChangesResponse(BaseModel):
+    """Fact row changes after a client's last-seen change version."""
+    version: int  # Pass as `since` on the next call
+    has_more: bool
+    upserts: list[FactRowResponse]
+    deleted: list[int]  # Ids of deleted rows
+
+
+# --- Search Schemas ---
+
+class SuggestionResponse(BaseModel):
+    kind: str  # "staff", "agent" or "bar"
+    value: str  # staff_search, agent key ("BAR|ID") or bar filter value
+    label: str
+    weight: int  # Days worked (staff) or rows (agents, bars)
+
+    class Config:
+        from_attributes = True
+
+
+class SuggestResponse(BaseModel):
+    suggestions: list[SuggestionResponse]
+    data_version: str  # Version the index was built from
 
 
 # --- Settings Schemas ---
@@ -187,3 +238,35 @@ class AgentRangeRuleResponse(AgentRangeRuleBase):
 
     class Config:
         from_attributes = True
+
+
+class BonusTier(BaseModel):
+    min_avg_staff: float = Field(..., gt=0)  # Average daily staff over the month
+    amount: int = Field(..., ge=0)  # THB
+
+
+class BonusRuleSetBase(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    a_min_staff: int = Field(10, ge=0)
+    a_per_staff: int = Field(50, ge=0)
+    b_min_profit: int = Field(1500, ge=0)
+    b_per_staff: int = Field(50, ge=0)
+    c_tiers: list[BonusTier] = [
+        BonusTier(min_avg_staff=40, amount=40000),
+        BonusTier(min_avg_staff=30, amount=30000),
+        BonusTier(min_avg_staff=20, amount=20000),
+    ]
+
+
+class BonusRuleSetCreate(BonusRuleSetBase):
+    pass
+
+
+class BonusRuleSetResponse(BonusRuleSetBase):
+    id: int
+    is_active: bool
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,424 @@
+"""
+In-process columnar analytics engine.
+
+Optional (settings.analytics_engine_enabled): fact_rows is loaded into NumPy
+arrays once per data version and /rows/kpis, the leaderboard and payroll
+aggregates are answered with vectorized group-bys instead of SQL.
+
+Layout: text columns (bar, agent, staff_id, contract) are dictionary-encoded
+into int32 codes, dates are int64 epoch seconds, money/drinks are int64
+cents with a separate NULL mask, so sums are exact like Postgres numeric.
+The engine is rebuilt lazily whenever the data version changes, and eagerly
+after an import commit in this worker; the first worker to build a version
+publishes it as an Arrow snapshot that the others memory-map (fact_snapshot).
+Nothing is built or published while the engine is disabled.
+"""
+import asyncio
+import logging
+import re
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable, Sequence
+
+import numpy as np
+import pyarrow as pa
+from sqlalchemy import select
+
+from app.core.config import get_settings
+from app.core.db import async_session_factory
+from app.models import FactRow
+from app.services.data_version import current_fact_version, get_fact_version, invalidate_fact_version
+from app.services.fact_snapshot import open_snapshot, publish_snapshot
+
+SECONDS_PER_DAY = 86400
+EPOCH = datetime(1970, 1, 1)
+
+# Code column -> attribute holding its dictionary
+CODE_COLUMNS = {"bar": "bars", "agent": "agents", "staff": "staff_ids", "contract": "contracts"}
+VALUE_COLUMNS = ["ts", "ts_code", "month", "source_year"]
+# Int64 cents with a NULL mask
+CENT_COLUMNS = ["profit", "drinks"]
+
+LeaderboardRow = namedtuple("LeaderboardRow", "id name bar agent_id profit drinks days")
+PayrollDayRow = namedtuple("PayrollDayRow", "bar agent_id_derived date staff_count high_perf_count")
+
+# Fact rows fetched per round trip while loading the engine
+LOAD_PARTITION_ROWS = 10_000
+
+logger = logging.getLogger(__name__)
+
+_engine: "AnalyticsEngine | None" = None
+_load_lock = asyncio.Lock()
+_refresh_task: asyncio.Task | None = None
+
+
+def _encode(values: Sequence[Any]) -> tuple[np.ndarray, list[Any]]:
+    """Dictionary-encode values (None allowed) in first-seen order."""
+    dictionary: dict[Any, int] = {}
+    codes = np.fromiter(
+        (dictionary.setdefault(v, len(dictionary)) for v in values),
+        dtype=np.int32,
+        count=len(values),
+    )
+    return codes, list(dictionary)
+
+
+def _cents(values: Sequence[Any]) -> tuple[np.ndarray, np.ndarray]:
+    """Numeric(10, 2) values -> (int64 cents with NULL as 0, NULL mask)."""
+    nulls = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+    cents = np.fromiter(
+        (0 if v is None else int(round(v * 100)) for v in values),
+        dtype=np.int64,
+        count=len(values),
+    )
+    return cents, nulls
+
+
+def _nullable_values(column: pa.Array) -> tuple[np.ndarray, np.ndarray]:
+    """Int64 Arrow array -> (values as a view on its data buffer, NULL mask)."""
+    values = np.frombuffer(column.buffers()[1], dtype=np.int64, count=len(column), offset=column.offset * 8)
+    return values, column.is_null().to_numpy(zero_copy_only=False)
+
+
+def _seconds(value: date | datetime) -> int:
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    return int((value - EPOCH).total_seconds())
+
+
+def _contains_regex(term: str) -> re.Pattern:
+    """Regex equivalent of filters.staff_search_condition (case-insensitive literal substring)."""
+    return re.compile(re.escape(term), re.IGNORECASE)
+
+
+class AnalyticsEngine:
+    """Column arrays of fact_rows for one data version."""
+
+    def __init__(self, version: str, arrays: dict[str, np.ndarray], dictionaries: dict[str, list[Any]]):
+        self.version = version
+        self.size = len(arrays["ts"])
+        for name in CODE_COLUMNS:
+            setattr(self, name, arrays[name])
+            setattr(self, CODE_COLUMNS[name], dictionaries[name])
+        for name in VALUE_COLUMNS + CENT_COLUMNS:
+            setattr(self, name, arrays[name])
+        for name in CENT_COLUMNS:
+            setattr(self, f"{name}_null", arrays[f"{name}_null"])
+
+        self.bar_index = {v: i for i, v in enumerate(self.bars)}
+        self.contract_index = {v: i for i, v in enumerate(self.contracts)}
+        self.has_agent = np.array([a is not None for a in self.agents], dtype=bool)[self.agent]
+
+    @classmethod
+    def from_rows(cls, version: str, rows: Sequence[Sequence[Any]]) -> "AnalyticsEngine":
+        """Build from (bar, agent, staff_id, contract, date, source_year, profit, drinks) rows."""
+        size = len(rows)
+        bars, agents, staff, contracts, dates, source_years, profits, drinks = (
+            list(column) for column in zip(*rows)
+        ) if rows else ([] for _ in range(8))
+
+        arrays, dictionaries = {}, {}
+        for name, values in zip(CODE_COLUMNS, (bars, agents, staff, contracts)):
+            arrays[name], dictionaries[name] = _encode(values)
+
+        ts = np.fromiter((_seconds(d) for d in dates), dtype=np.int64, count=size)
+        days = (ts // SECONDS_PER_DAY).astype("datetime64[D]")
+        arrays["ts"] = ts
+        arrays["ts_code"] = np.unique(ts, return_inverse=True)[1].ravel().astype(np.int64)
+        arrays["month"] = (days.astype("datetime64[M]").astype(np.int64) % 12 + 1).astype(np.int8)
+        arrays["source_year"] = np.asarray(source_years, dtype=np.int32)
+        arrays["profit"], arrays["profit_null"] = _cents(profits)
+        arrays["drinks"], arrays["drinks_null"] = _cents(drinks)
+        return cls(version, arrays, dictionaries)
+
+    # --- Snapshots ---
+
+    def to_batch(self) -> pa.RecordBatch:
+        """The engine's columns as one Arrow record batch (see fact_snapshot)."""
+        columns = {
+            name: pa.DictionaryArray.from_arrays(getattr(self, name), pa.array(getattr(self, attr)))
+            for name, attr in CODE_COLUMNS.items()
+        }
+        columns.update({name: pa.array(getattr(self, name)) for name in VALUE_COLUMNS})
+        columns.update({
+            name: pa.array(getattr(self, name), mask=getattr(self, f"{name}_null"))
+            for name in CENT_COLUMNS
+        })
+        return pa.RecordBatch.from_pydict(columns, metadata={"version": self.version})
+
+    @classmethod
+    def from_batch(cls, version: str, batch: pa.RecordBatch) -> "AnalyticsEngine":
+        """
+        Build from a record batch written by to_batch. Numeric columns are
+        views on the batch buffers, so a memory-mapped batch is not copied.
+        """
+        arrays, dictionaries = {}, {}
+        for name in CODE_COLUMNS:
+            column = batch.column(name)
+            arrays[name] = column.indices.to_numpy()
+            dictionaries[name] = column.dictionary.to_pylist()
+        for name in VALUE_COLUMNS:
+            arrays[name] = batch.column(name).to_numpy()
+        for name in CENT_COLUMNS:
+            arrays[name], arrays[f"{name}_null"] = _nullable_values(batch.column(name))
+        return cls(version, arrays, dictionaries)
+
+    # --- Filters ---
+
+    def _in(self, column: np.ndarray, index: dict[Any, int], values: Iterable[Any]) -> np.ndarray:
+        codes = [index[v] for v in values if v in index]
+        return np.isin(column, codes)
+
+    def _staff_matching(self, term: str) -> np.ndarray:
+        regex = _contains_regex(term)
+        matching = np.array([bool(regex.search(s)) for s in self.staff_ids], dtype=bool)
+        return matching[self.staff] if self.size else np.zeros(0, bool)
+
+    def _agent_mask(self, keys: list[str]) -> np.ndarray | None:
+        """Same rules as filters.parse_agent_keys; None when no key is valid."""
+        agent_index = {v: i for i, v in enumerate(self.agents)}
+        mask, valid = np.zeros(self.size, bool), False
+        for key in keys:
+            if "|" not in key:
+                continue
+            try:
+                target_bar, target_id = key.split("|")
+                agent = None if target_id in ("0", "NULL") else int(target_id)
+            except ValueError:
+                continue
+            valid = True
+            if target_bar in self.bar_index and agent in agent_index:
+                mask |= (self.bar == self.bar_index[target_bar]) & (self.agent == agent_index[agent])
+        return mask if valid else None
+
+    def mask(self, filters) -> np.ndarray:
+        """Row mask for a RowFilters instance (same semantics as its SQL conditions)."""
+        m = np.ones(self.size, bool)
+        if filters.bar:
+            m &= self._in(self.bar, self.bar_index, filters.bar)
+        if filters.date_range:
+            s_date, e_date = filters.date_range
+            m &= (self.ts >= _seconds(s_date)) & (self.ts < _seconds(e_date + timedelta(days=1)))
+        else:
+            if filters.year:
+                m &= np.isin(self.source_year, filters.year)
+            if filters.month:
+                m &= np.isin(self.month, filters.month)
+        if filters.contract:
+            m &= self._in(self.contract, self.contract_index, filters.contract)
+        if filters.agent:
+            agent_mask = self._agent_mask(filters.agent)
+            if agent_mask is not None:
+                m &= agent_mask
+        if filters.staff_search:
+            m &= self._staff_matching(filters.staff_search)
+        return m
+
+    # --- Queries ---
+
+    def kpis(self, filters) -> dict[str, Any]:
+        """Same fields as RowsKPIResponse."""
+        m = self.mask(filters)
+        profit_valid = m & ~self.profit_null
+        profit_count = int(profit_valid.sum())
+        total_profit = int(self.profit[profit_valid].sum())
+        total_drinks = int(self.drinks[m & ~self.drinks_null].sum())
+        return {
+            "total_rows": int(m.sum()),
+            "total_profit": total_profit / 100,
+            "total_drinks": total_drinks / 100,
+            "avg_profit": total_profit / 100 / profit_count if profit_count else 0.0,
+            "unique_staff": int(np.count_nonzero(np.bincount(self.staff[m], minlength=len(self.staff_ids)))),
+        }
+
+    def _group(self, m: np.ndarray, columns: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        """Group masked rows by code columns -> (first row index per group, group of each masked row)."""
+        key = np.zeros(int(m.sum()), dtype=np.int64)
+        for column in columns:
+            width = int(column.max()) + 1 if column.size else 1
+            key = key * width + column[m]
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        return np.flatnonzero(m)[first], inverse.ravel()
+
+    def _distinct_per_group(self, inverse: np.ndarray, values: np.ndarray, groups: int) -> np.ndarray:
+        width = int(values.max()) + 1 if values.size else 1
+        pairs = np.unique(inverse.astype(np.int64) * width + values)
+        return np.bincount(pairs // width, minlength=groups)
+
+    def leaderboard(
+        self,
+        type: str,
+        mode: str,
+        sort_by: str,
+        search: str | None,
+        bar: str | None,
+        year: int | None,
+        month: int | None,
+    ) -> list[LeaderboardRow]:
+        """Rows of /analytics/leaderboard, in its order."""
+        m = np.ones(self.size, bool)
+        if bar:
+            m &= self.bar == self.bar_index.get(bar, -1)
+        if year:
+            m &= self.source_year == year
+        if month:
+            m &= self.month == month
+        if search and type == "STAFF":
+            m &= self._staff_matching(search)
+        if type == "STAFF":
+            columns = [self.bar, self.agent, self.staff]
+        else:
+            m &= self.has_agent
+            columns = [self.bar, self.agent]
+
+        first, inverse = self._group(m, columns)
+        groups = len(first)
+        profit = np.bincount(inverse, weights=self.profit[m], minlength=groups)
+        profit_values = np.bincount(inverse, weights=~self.profit_null[m], minlength=groups)
+        drinks = np.bincount(inverse, weights=self.drinks[m], minlength=groups)
+        drinks_values = np.bincount(inverse, weights=~self.drinks_null[m], minlength=groups)
+        days = self._distinct_per_group(inverse, self.ts_code[m], groups)
+
+        # SUM over only NULLs is NULL; NULLs sort first in DESC, last in ASC
+        sort_values, sort_nulls = {
+            "PROFIT": (profit, profit_values == 0),
+            "DRINKS": (drinks, drinks_values == 0),
+            "DAYS": (days.astype(np.float64), np.zeros(groups, bool)),
+        }[sort_by]
+        if mode == "FLOP10":
+            order = np.lexsort((sort_values, sort_nulls))
+        else:
+            order = np.lexsort((-sort_values, ~sort_nulls))
+        if mode in ("TOP10", "FLOP10"):
+            order = order[:10]
+
+        entries = []
+        for g in order:
+            row = first[g]
+            bar_name = self.bars[self.bar[row]]
+            agent_id = self.agents[self.agent[row]]
+            if type == "STAFF":
+                entry_id = entry_name = self.staff_ids[self.staff[row]]
+            else:
+                entry_id = f"{bar_name}|{agent_id}"
+                entry_name = f"Agent {agent_id} ({bar_name})"
+            entries.append(LeaderboardRow(
+                id=entry_id,
+                name=entry_name,
+                bar=bar_name,
+                agent_id=agent_id,
+                profit=None if profit_values[g] == 0 else profit[g] / 100,
+                drinks=None if drinks_values[g] == 0 else drinks[g] / 100,
+                days=int(days[g]),
+            ))
+        return entries
+
+    def payroll_daily(
+        self,
+        start_date: date,
+        end_date: date,
+        bar: str | None,
+        high_perf_min_profit: float,
+    ) -> list[PayrollDayRow]:
+        """Staff and high performer counts per (bar, agent, date), agents only."""
+        m = self.has_agent & (self.ts >= _seconds(start_date)) & (self.ts <= _seconds(end_date))
+        if bar:
+            m &= self.bar == self.bar_index.get(bar, -1)
+        first, inverse = self._group(m, [self.bar, self.agent, self.ts_code])
+        groups = len(first)
+        staff_count = np.bincount(inverse, minlength=groups)
+        high_perf = (~self.profit_null[m]) & (self.profit[m] >= round(high_perf_min_profit * 100))
+        high_perf_count = np.bincount(inverse, weights=high_perf, minlength=groups)
+        return [
+            PayrollDayRow(
+                bar=self.bars[self.bar[row]],
+                agent_id_derived=self.agents[self.agent[row]],
+                date=EPOCH + timedelta(seconds=int(self.ts[row])),
+                staff_count=int(staff_count[g]),
+                high_perf_count=int(high_perf_count[g]),
+            )
+            for g, row in enumerate(first)
+        ]
+
+    def staff_pools(self, active_cutoff: date) -> tuple[dict[str, int], dict[str, int]]:
+        """Distinct staff per "BAR|ID" agent: (since active_cutoff, all time)."""
+        pools = []
+        for m in (self.has_agent & (self.ts >= _seconds(active_cutoff)), self.has_agent):
+            first, inverse = self._group(m, [self.bar, self.agent])
+            counts = self._distinct_per_group(inverse, self.staff[m].astype(np.int64), len(first))
+            pools.append({
+                f"{self.bars[self.bar[row]]}|{self.agents[self.agent[row]]}": int(counts[g])
+                for g, row in enumerate(first)
+            })
+        return pools[0], pools[1]
+
+
+_ENGINE_QUERY = select(
+    FactRow.bar,
+    FactRow.agent_id_derived,
+    FactRow.staff_id,
+    FactRow.contract,
+    FactRow.date,
+    FactRow.source_year,
+    FactRow.profit,
+    FactRow.drinks,
+)
+
+
+async def load_engine() -> AnalyticsEngine:
+    """
+    Engine for the current data version: memory-mapped from its snapshot
+    when another worker already published one, else read from fact_rows
+    and published. The version and the rows are read in one REPEATABLE
+    READ transaction, so a snapshot is never labelled with a version other
+    than the one its rows belong to.
+    """
+    async with async_session_factory() as session:
+        await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        version = await get_fact_version(session)
+        batch = await asyncio.to_thread(open_snapshot, version)
+        if batch is not None:
+            return AnalyticsEngine.from_batch(version, batch)
+        # Streamed in partitions so other requests run between them
+        rows = []
+        async for partition in (await session.stream(_ENGINE_QUERY)).partitions(LOAD_PARTITION_ROWS):
+            rows.extend(partition)
+    # Encoding and writing are CPU-bound: keep them off the event loop
+    engine = await asyncio.to_thread(AnalyticsEngine.from_rows, version, rows)
+    await asyncio.to_thread(lambda: publish_snapshot(version, engine.to_batch()))
+    return engine
+
+
+async def get_engine() -> AnalyticsEngine | None:
+    """The engine for the current data version, or None when disabled."""
+    global _engine
+    if not get_settings().analytics_engine_enabled:
+        return None
+    version = await current_fact_version()
+    if _engine is not None and _engine.version == version:
+        return _engine
+    async with _load_lock:
+        if _engine is None or _engine.version != version:
+            _engine = await load_engine()
+            if _engine.version != version:
+                # The cached version was stale; re-read it on the next call
+                invalidate_fact_version()
+    return _engine
+
+
+def _log_refresh_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Analytics engine refresh failed", exc_info=task.exception())
+
+
+def schedule_engine_refresh() -> None:
+    """
+    Rebuild the engine, and publish its snapshot for the other workers, in
+    the background after a write (call after invalidate_fact_version).
+    Workers share their settings, so with the engine disabled no worker
+    would read a snapshot and none is written.
+    """
+    global _refresh_task
+    if get_settings().analytics_engine_enabled:
+        _refresh_task = asyncio.get_running_loop().create_task(get_engine())
+        _refresh_task.add_done_callback(_log_refresh_failure)
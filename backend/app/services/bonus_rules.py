@@ -0,0 +1,173 @@
+"""
+Payroll bonus rules and what-if simulation.
+
+BonusRules holds one rule set; the defaults are the historical constants
+and apply while no BonusRuleSet row is active. simulate() evaluates any
+number of rule sets over the same agent-daily data with NumPy, so
+comparing candidate policies over a year is a single query plus a few
+vector operations.
+"""
+import math
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import BonusRuleSet, FactRow
+
+DEFAULT_C_TIERS = ((40, 40000), (30, 30000), (20, 20000))
+
+
+@dataclass(frozen=True)
+class BonusRules:
+    """One bonus rule set; C tiers are (min avg daily staff, amount), best first."""
+    name: str = "default"
+    a_min_staff: int = 10
+    a_per_staff: int = 50
+    b_min_profit: int = 1500
+    b_per_staff: int = 50
+    c_tiers: tuple[tuple[float, int], ...] = DEFAULT_C_TIERS
+
+    @classmethod
+    def from_values(cls, name: str, c_tiers: Iterable[Sequence[float]], **values) -> "BonusRules":
+        tiers = sorted(((float(min_avg), int(amount)) for min_avg, amount in c_tiers), reverse=True)
+        return cls(name=name, c_tiers=tuple(tiers), **values)
+
+    @classmethod
+    def from_model(cls, rule_set: BonusRuleSet) -> "BonusRules":
+        return cls.from_values(
+            rule_set.name,
+            [(tier["min_avg_staff"], tier["amount"]) for tier in rule_set.c_tiers],
+            a_min_staff=rule_set.a_min_staff,
+            a_per_staff=rule_set.a_per_staff,
+            b_min_profit=rule_set.b_min_profit,
+            b_per_staff=rule_set.b_per_staff,
+        )
+
+    def bonus_a(self, staff_count: int) -> int:
+        return self.a_per_staff * staff_count if staff_count >= self.a_min_staff else 0
+
+    def bonus_b(self, high_perf_count: int) -> int:
+        return self.b_per_staff * high_perf_count
+
+    def bonus_c_tier(self, avg_staff: float) -> tuple[int, int, Optional[int]]:
+        """Return (bonus_c, current_tier, next_tier_target) for an average daily staff."""
+        next_tier_target = None
+        for min_avg, amount in self.c_tiers:
+            if avg_staff >= min_avg:
+                return amount, amount, next_tier_target
+            next_tier_target = math.ceil(min_avg)  # Whole staff needed to reach a fractional tier
+        return 0, 0, next_tier_target
+
+
+DEFAULT_BONUS_RULES = BonusRules()
+
+
+async def get_active_rules(db: AsyncSession) -> BonusRules:
+    """Rules of the active rule set, or the defaults when none is active."""
+    rule_set = (await db.execute(
+        select(BonusRuleSet).where(BonusRuleSet.is_active.is_(True)).order_by(BonusRuleSet.id).limit(1)
+    )).scalar_one_or_none()
+    return BonusRules.from_model(rule_set) if rule_set else DEFAULT_BONUS_RULES
+
+
+# --- Simulation ---
+
+@dataclass
+class AgentDays:
+    """Per (agent, date) payroll inputs over a period, as parallel arrays."""
+    agents: list[tuple[str, int]]  # (bar, agent_id) of each agent code
+    agent: np.ndarray  # Agent code per day
+    agent_month: np.ndarray  # (agent, calendar month) group per day
+    staff_count: np.ndarray
+    # Staff with profit >= threshold per day, keyed by threshold
+    high_perf: dict[int, np.ndarray] = field(default_factory=dict)
+
+
+async def fetch_agent_days(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    bar: Optional[str],
+    thresholds: Iterable[int],
+) -> AgentDays:
+    """Daily staff and high performer counts (one column per profit threshold) in one query."""
+    thresholds = sorted(set(thresholds))
+    conditions = [
+        FactRow.date >= start_date,
+        FactRow.date <= end_date,
+        FactRow.agent_id_derived.is_not(None),
+    ]
+    if bar:
+        conditions.append(FactRow.bar == bar)
+    rows = (await db.execute(
+        select(
+            FactRow.bar,
+            FactRow.agent_id_derived,
+            FactRow.year,
+            FactRow.month,
+            func.count(FactRow.id),
+            *(func.count(FactRow.id).filter(FactRow.profit >= t) for t in thresholds),
+        )
+        .where(*conditions)
+        .group_by(FactRow.bar, FactRow.agent_id_derived, FactRow.day, FactRow.year, FactRow.month)
+    )).all()
+
+    columns = np.array([row[2:] for row in rows], dtype=np.int64).reshape(len(rows), 3 + len(thresholds))
+    agent_codes: dict[tuple[str, int], int] = {}
+    agent = np.fromiter(
+        (agent_codes.setdefault((row[0], row[1]), len(agent_codes)) for row in rows),
+        dtype=np.int64,
+        count=len(rows),
+    )
+    months = columns[:, 0] * 12 + columns[:, 1]
+    agent_month = np.unique(agent * (months.max(initial=0) + 1) + months, return_inverse=True)[1].ravel()
+    return AgentDays(
+        agents=list(agent_codes),
+        agent=agent,
+        agent_month=agent_month,
+        staff_count=columns[:, 2],
+        high_perf={t: columns[:, 3 + i] for i, t in enumerate(thresholds)},
+    )
+
+
+def simulate(days: AgentDays, rule_sets: Sequence[BonusRules]) -> np.ndarray:
+    """
+    Bonus A, B and C per rule set and agent, shape (rule sets, agents, 3).
+    C is evaluated per calendar month on the average staff of days worked,
+    like the monthly payroll.
+    """
+    agents = len(days.agents)
+    costs = np.zeros((len(rule_sets), agents, 3), dtype=np.int64)
+    if not agents:
+        return costs
+
+    # Rule parameters as columns: every rule set is evaluated at once for A and B
+    a_min = np.array([[r.a_min_staff] for r in rule_sets])
+    a_per = np.array([[r.a_per_staff] for r in rule_sets])
+    b_per = np.array([[r.b_per_staff] for r in rule_sets])
+    high_perf = np.stack([days.high_perf[r.b_min_profit] for r in rule_sets])
+
+    bonus_a = np.where(days.staff_count >= a_min, days.staff_count * a_per, 0)
+    bonus_b = high_perf * b_per
+    for i in range(len(rule_sets)):
+        costs[i, :, 0] = np.bincount(days.agent, weights=bonus_a[i], minlength=agents)
+        costs[i, :, 1] = np.bincount(days.agent, weights=bonus_b[i], minlength=agents)
+
+    # C: one tier per (agent, month) from its average daily staff
+    groups = int(days.agent_month.max()) + 1
+    avg_staff = (
+        np.bincount(days.agent_month, weights=days.staff_count, minlength=groups)
+        / np.bincount(days.agent_month, minlength=groups)
+    )
+    group_agent = np.zeros(groups, dtype=np.int64)
+    group_agent[days.agent_month] = days.agent
+    for i, rules in enumerate(rule_sets):
+        amount = np.zeros(groups, dtype=np.int64)
+        for min_avg, tier_amount in reversed(rules.c_tiers):
+            amount[avg_staff >= min_avg] = tier_amount
+        costs[i, :, 2] = np.bincount(group_agent, weights=amount, minlength=agents)
+    return costs
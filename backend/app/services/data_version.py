@@ -0,0 +1,127 @@
+"""
+Data version tracking.
+
+Two versions are tracked:
+
+- The fact version identifies the state of the fact table: it changes when
+  an import is committed or deleted, or when agent range rules change.
+  Fact-derived caches (analytics engine, Arrow snapshots, facets, suggest
+  index) are stamped with it.
+- The data version identifies everything a response can depend on: the
+  fact version plus run activity (staging, failures), bonus rule sets and
+  payroll snapshots. ETags are derived from it.
+"""
+import asyncio
+import hashlib
+import time
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.db import async_session_factory
+from app.models import AgentRangeRule, BonusRuleSet, ImportRun, ImportStatus, PayrollSnapshot
+
+FACT, DATA = "fact", "data"
+
+# Process-wide caches: kind -> (version, monotonic time it was read)
+_cached_versions: dict[str, tuple[str, float]] = {}
+_refresh_lock = asyncio.Lock()
+
+
+def _version(run_id: int | None, parts: list[Any]) -> str:
+    digest = hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f"{run_id or 0}.{digest[:12]}"
+
+
+async def _fact_parts(db: AsyncSession) -> list[Any]:
+    completed = ImportRun.status == ImportStatus.COMPLETED
+    runs = select(
+        func.max(ImportRun.id).filter(completed),
+        func.count(ImportRun.id).filter(completed),
+        func.max(ImportRun.completed_at).filter(completed),
+    )
+    rules = select(func.count(AgentRangeRule.id), func.max(AgentRangeRule.updated_at))
+    return [*(await db.execute(runs)).one(), *(await db.execute(rules)).one()]
+
+
+async def get_fact_version(db: AsyncSession) -> str:
+    """
+    Compute the fact version as "<last_committed_run_id>.<digest>".
+    The digest covers committed runs and agent range rules.
+    """
+    parts = await _fact_parts(db)
+    return _version(parts[0], parts)
+
+
+async def get_data_version(db: AsyncSession) -> str:
+    """
+    Compute the current data version as "<last_committed_run_id>.<digest>".
+    The digest covers the fact version's inputs plus run activity (staging,
+    failures), bonus rule sets and payroll snapshots.
+    """
+    fact_parts = await _fact_parts(db)
+    runs = select(
+        func.count(ImportRun.id).filter(ImportRun.status == ImportStatus.FAILED),
+        func.max(ImportRun.id),
+        func.count(ImportRun.id),
+        func.max(ImportRun.completed_at),
+    )
+    bonus_rules = select(
+        func.count(BonusRuleSet.id),
+        func.max(BonusRuleSet.updated_at),
+        func.max(BonusRuleSet.id).filter(BonusRuleSet.is_active.is_(True)),
+    )
+    snapshots = select(
+        func.count(PayrollSnapshot.id),
+        func.max(PayrollSnapshot.closed_at),
+        func.max(PayrollSnapshot.invalidated_at),
+    )
+
+    parts = [*fact_parts]
+    for query in (runs, bonus_rules, snapshots):
+        parts.extend((await db.execute(query)).one())
+    return _version(fact_parts[0], parts)
+
+
+async def _current(kind: str, compute: Callable[[AsyncSession], Awaitable[str]]) -> str:
+    ttl = get_settings().data_version_ttl_seconds
+    cached = _cached_versions.get(kind)
+    if cached and time.monotonic() - cached[1] < ttl:
+        return cached[0]
+    
+    async with _refresh_lock:
+        cached = _cached_versions.get(kind)
+        if cached and time.monotonic() - cached[1] < ttl:
+            return cached[0]
+        async with async_session_factory() as session:
+            version = await compute(session)
+        _cached_versions[kind] = (version, time.monotonic())
+        return version
+
+
+async def current_fact_version() -> str:
+    """Cached fact version for fact-derived caches (see current_data_version)."""
+    return await _current(FACT, get_fact_version)
+
+
+async def current_data_version() -> str:
+    """
+    Cached data version for hot paths (ETags).
+    Re-read from the database at most every `data_version_ttl_seconds`;
+    writes in this process call invalidate_data_version() or
+    invalidate_fact_version() to refresh at once.
+    """
+    return await _current(DATA, get_data_version)
+
+
+def invalidate_data_version() -> None:
+    """Drop the cached data version after a write that leaves the facts unchanged."""
+    _cached_versions.pop(DATA, None)
+
+
+def invalidate_fact_version() -> None:
+    """Drop both cached versions after a write that changes the facts."""
+    _cached_versions.pop(FACT, None)
+    _cached_versions.pop(DATA, None)
@@ -0,0 +1,86 @@
+"""
+Columnar fact snapshots shared by all workers.
+
+After an import the analytics engine's columns are written once as an
+Arrow IPC file named after the data version. Every worker that moves to
+that version memory-maps the file instead of reading fact_rows from
+Postgres, so the page cache holds one copy for all workers.
+
+Files are immutable: a snapshot is written to a temporary name and
+atomically renamed into place, and old versions are removed once a newer
+one is published. Workers that still map a removed file keep reading it
+until they move on (unlinking a mapped file is safe on POSIX).
+"""
+import os
+import tempfile
+from pathlib import Path
+
+import pyarrow as pa
+
+from app.core.config import get_settings
+
+SNAPSHOT_PREFIX = "facts-"
+SNAPSHOT_SUFFIX = ".arrow"
+# Published snapshots kept besides the newest one
+KEEP_PREVIOUS = 1
+
+
+def snapshot_dir() -> Path | None:
+    """Snapshot directory, or None when snapshots are disabled."""
+    path = get_settings().fact_snapshot_dir
+    return Path(path) if path else None
+
+
+def snapshot_path(directory: Path, version: str) -> Path:
+    return directory / f"{SNAPSHOT_PREFIX}{version}{SNAPSHOT_SUFFIX}"
+
+
+def open_snapshot(version: str) -> pa.RecordBatch | None:
+    """Memory-map the snapshot of `version`; None when it was not published."""
+    directory = snapshot_dir()
+    if directory is None:
+        return None
+    path = snapshot_path(directory, version)
+    try:
+        source = pa.memory_map(str(path), "r")
+    except FileNotFoundError:
+        return None
+    reader = pa.ipc.open_file(source)
+    if reader.num_record_batches != 1:
+        return None
+    return reader.get_batch(0)
+
+
+def publish_snapshot(version: str, batch: pa.RecordBatch) -> Path | None:
+    """Write the snapshot of `version` (no-op if already published) and prune old ones."""
+    directory = snapshot_dir()
+    if directory is None:
+        return None
+    directory.mkdir(parents=True, exist_ok=True)
+    path = snapshot_path(directory, version)
+    if not path.exists():
+        fd, tmp_name = tempfile.mkstemp(dir=directory, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as sink, pa.ipc.new_file(sink, batch.schema) as writer:
+                writer.write_batch(batch)
+            os.replace(tmp_name, path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+    prune_snapshots(directory, keep=path)
+    return path
+
+
+def prune_snapshots(directory: Path, keep: Path) -> None:
+    """Remove snapshots older than `keep` beyond the KEEP_PREVIOUS most recent ones."""
+    others = []
+    for path in directory.glob(f"{SNAPSHOT_PREFIX}*{SNAPSHOT_SUFFIX}"):
+        if path == keep:
+            continue
+        try:
+            others.append((path.stat().st_mtime, path))
+        except FileNotFoundError:  # pruned concurrently by another worker
+            continue
+    others.sort(reverse=True)
+    for _, path in others[KEEP_PREVIOUS:]:
+        path.unlink(missing_ok=True)
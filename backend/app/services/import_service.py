@@ -17,6 +17,7 @@ from typing import Any
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import get_settings
@@ -29,7 +30,11 @@ from app.models import (
     ImportStatus,
     ImportMode,
     RawRow,
+    Staff,
 )
+from app.services.payroll_snapshots import invalidate_snapshots
+from app.services.rollup_service import refresh_rollups
+from app.services.row_changes import lock_fact_writes
 
 # Column mapping A->Q (0-indexed)
 COLUMN_MAP = {
@@ -261,6 +266,31 @@ async def derive_agent_id(db: AsyncSession, bar: str, staff_num_prefix: int | No
     return rule.agent_id if rule else None
 
 
+async def resolve_staff_key(
+    db: AsyncSession,
+    staff_id: str,
+    staff_num_prefix: int | None,
+    cache: dict[str, int],
+) -> int:
+    """
+    Staff dimension key for staff_id, inserting the staff on first sight.
+    `cache` holds the keys already resolved during the current import.
+    """
+    key = cache.get(staff_id)
+    if key is None:
+        key = (await db.execute(select(Staff.id).where(Staff.staff_id == staff_id))).scalar()
+        if key is None:
+            # ON CONFLICT: a concurrent import may insert the same staff
+            await db.execute(
+                pg_insert(Staff)
+                .values(staff_id=staff_id, staff_num_prefix=staff_num_prefix)
+                .on_conflict_do_nothing(index_elements=[Staff.staff_id])
+            )
+            key = (await db.execute(select(Staff.id).where(Staff.staff_id == staff_id))).scalar_one()
+        cache[staff_id] = key
+    return key
+
+
 def parse_agent_label(agent_str: str | None) -> int | None:
     """
     Parse agent label from sheet (e.g., "AGENT #5" -> 5, "5" -> 5).
@@ -373,8 +403,12 @@ async def commit_import(db: AsyncSession, run_id: int) -> ImportRun:
         "rows_updated": 0,
         "rows_unchanged": 0,
     }
+    touched_days = set()  # Dates with inserted/updated rows
+    staff_keys: dict[str, int] = {}  # staff_id -> staff dimension key
     
     try:
+        await lock_fact_writes(db)
+        
         # Fetch all raw rows
         result = await db.execute(
             select(RawRow).where(RawRow.import_run_id == run_id).order_by(RawRow.sheet_row_number)
@@ -449,6 +483,7 @@ async def commit_import(db: AsyncSession, run_id: int) -> ImportRun:
                     existing_row.agent_id_derived = agent_id_derived
                     existing_row.agent_mismatch = agent_mismatch
                     stats["rows_updated"] += 1
+                    touched_days.add(parsed_date.date())
             else:
                 fact_row = FactRow(
                     business_key=business_key,
@@ -459,6 +494,7 @@ async def commit_import(db: AsyncSession, run_id: int) -> ImportRun:
                     date=parsed_date,
                     agent_label=normalized.get("agent"),
                     staff_id=staff_id,
+                    staff_key=await resolve_staff_key(db, staff_id, staff_num_prefix, staff_keys),
                     position=normalized.get("position"),
                     salary=parse_numeric(normalized.get("salary")),
                     start_time=normalized.get("start"),
@@ -478,6 +514,7 @@ async def commit_import(db: AsyncSession, run_id: int) -> ImportRun:
                 )
                 db.add(fact_row)
                 stats["rows_inserted"] += 1
+                touched_days.add(parsed_date.date())
 
         # Update run stats
         import_run.status = ImportStatus.COMPLETED
@@ -487,6 +524,8 @@ async def commit_import(db: AsyncSession, run_id: int) -> ImportRun:
         import_run.rows_unchanged = stats["rows_unchanged"]
         # rows_errored and rows_fetched remains same from STAGED phase
         
+        await refresh_rollups(db, touched_days)
+        await invalidate_snapshots(db, {day.replace(day=1) for day in touched_days})
         await db.commit()
         await db.refresh(import_run)
         return import_run
@@ -525,12 +564,17 @@ async def _run_single_import(
         "rows_unchanged": 0,
         "rows_errored": 0,
     }
+    touched_days = set()  # Dates with inserted/updated rows
+    staff_keys: dict[str, int] = {}  # staff_id -> staff dimension key
     
     try:
         # Fetch data from Google Sheets
         rows = await fetch_sheet_data(source)
         stats["rows_fetched"] = len(rows)
         
+        if not dry_run:
+            await lock_fact_writes(db)
+        
         all_row_hashes = []
         
         for row_idx, row in enumerate(rows, start=2):  # Start at 2 (1-indexed, skip header)
@@ -623,6 +667,7 @@ async def _run_single_import(
                     existing_row.agent_id_derived = agent_id_derived
                     existing_row.agent_mismatch = agent_mismatch
                     stats["rows_updated"] += 1
+                    touched_days.add(parsed_date.date())
             else:
                 # Insert new fact row
                 fact_row = FactRow(
@@ -634,6 +679,7 @@ async def _run_single_import(
                     date=parsed_date,
                     agent_label=normalized.get("agent"),
                     staff_id=staff_id,
+                    staff_key=await resolve_staff_key(db, staff_id, staff_num_prefix, staff_keys),
                     position=normalized.get("position"),
                     salary=parse_numeric(normalized.get("salary")),
                     start_time=normalized.get("start"),
@@ -653,6 +699,7 @@ async def _run_single_import(
                 )
                 db.add(fact_row)
                 stats["rows_inserted"] += 1
+                touched_days.add(parsed_date.date())
         
         # Compute overall checksum (hash of all row hashes)
         checksum_str = "|".join(sorted(all_row_hashes))
@@ -669,6 +716,8 @@ async def _run_single_import(
         import_run.rows_errored = stats["rows_errored"]
         import_run.checksum = checksum
         
+        await refresh_rollups(db, touched_days)
+        await invalidate_snapshots(db, {day.replace(day=1) for day in touched_days})
         await db.commit()
         await db.refresh(import_run)
         
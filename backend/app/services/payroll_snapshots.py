@@ -0,0 +1,80 @@
+"""
+Frozen month-end payroll snapshots.
+
+A closed month stores its computed AgentPayroll rows so historical payroll
+is served as-is (reproducible for audit). Any later import that writes fact
+rows in that month invalidates the snapshot; the month must then be closed
+again.
+"""
+from datetime import date, datetime
+from typing import Any, Iterable
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import PayrollSnapshot
+
+
+def _bar_clause(bar: str | None):
+    return PayrollSnapshot.bar == bar if bar else PayrollSnapshot.bar.is_(None)
+
+
+async def get_snapshot(db: AsyncSession, month: date, bar: str | None) -> PayrollSnapshot | None:
+    """Get the valid (not invalidated) snapshot for a month and bar scope."""
+    result = await db.execute(
+        select(PayrollSnapshot)
+        .where(PayrollSnapshot.month == month)
+        .where(_bar_clause(bar))
+        .where(PayrollSnapshot.invalidated_at.is_(None))
+    )
+    return result.scalar_one_or_none()
+
+
+async def save_snapshot(
+    db: AsyncSession,
+    month: date,
+    bar: str | None,
+    agents: list[dict[str, Any]],
+    data_version: str,
+    closed_by_id: int | None,
+) -> PayrollSnapshot:
+    """
+    Create or replace the snapshot for a month and bar scope in one upsert
+    on the unique scope index, so concurrent closes of the same month keep
+    a single row.
+    """
+    values = {
+        "agents": agents,
+        "data_version": data_version,
+        "closed_by_id": closed_by_id,
+        "closed_at": datetime.utcnow(),
+        "invalidated_at": None,
+    }
+    stmt = (
+        pg_insert(PayrollSnapshot)
+        .values(month=month, bar=bar or None, **values)
+        .on_conflict_do_update(
+            index_elements=[PayrollSnapshot.month, func.coalesce(PayrollSnapshot.bar, "")],
+            set_=values,
+        )
+        .returning(PayrollSnapshot)
+    )
+    result = await db.execute(
+        select(PayrollSnapshot).from_statement(stmt),
+        execution_options={"populate_existing": True},
+    )
+    return result.scalar_one()
+
+
+async def invalidate_snapshots(db: AsyncSession, months: Iterable[date]) -> None:
+    """Invalidate snapshots of every month in `months` (first-of-month dates)."""
+    months = sorted(set(months))
+    if not months:
+        return
+    await db.execute(
+        update(PayrollSnapshot)
+        .where(PayrollSnapshot.month.in_(months))
+        .where(PayrollSnapshot.invalidated_at.is_(None))
+        .values(invalidated_at=datetime.utcnow())
+    )
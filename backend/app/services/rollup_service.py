@@ -0,0 +1,122 @@
+"""
+Rollup tables derived from fact rows.
+
+Rollups are refreshed day by day: every write path that inserts, updates or
+deletes fact rows passes the touched days, and those days are recomputed
+from fact_rows inside the same transaction (delete + insert). Monthly staff
+activity is recomputed for the months containing those days.
+"""
+from datetime import date
+from typing import Iterable
+
+from sqlalchemy import Date, and_, cast, delete, func, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import DailyRollup, DailyStaffSketch, FactRow, StaffMonthlyActivity
+from app.services.hll import sketch_entry
+
+MEASURES = ("profit", "drinks", "sale", "total")
+
+GRAIN = ("source_year", "month", "bar", "agent_id_derived", "contract", "position")
+
+SKETCH_GRAIN = ("source_year", "month", "bar", "agent_id_derived")
+
+
+def daily_rollup_select():
+    """Fact rows aggregated to the DailyRollup grain, in DailyRollup column order."""
+    measures = []
+    for name in MEASURES:
+        column = getattr(FactRow, name)
+        measures += [func.coalesce(func.sum(column), 0), func.count(column)]
+    grain = [getattr(FactRow, name) for name in GRAIN]
+    return (
+        select(
+            FactRow.day,
+            *grain,
+            func.count(),
+            func.count(FactRow.staff_key.distinct()),
+            *measures,
+        )
+        .group_by(FactRow.day, *grain)
+    )
+
+
+DAILY_ROLLUP_COLUMNS = [
+    "date", *GRAIN, "rows", "staff_count",
+    *(f"{name}_{suffix}" for name in MEASURES for suffix in ("sum", "count")),
+]
+
+
+def daily_sketch_select():
+    """Staff sketches per DailyStaffSketch grain, in DAILY_SKETCH_COLUMNS order."""
+    grain = [getattr(FactRow, name) for name in SKETCH_GRAIN]
+    return (
+        select(
+            FactRow.day,
+            *grain,
+            func.array_agg(sketch_entry(FactRow.staff_id).distinct()),
+        )
+        .group_by(FactRow.day, *grain)
+    )
+
+
+DAILY_SKETCH_COLUMNS = ["date", *SKETCH_GRAIN, "registers"]
+
+
+def _next_month(month_start: date) -> date:
+    return date(month_start.year + month_start.month // 12, month_start.month % 12 + 1, 1)
+
+
+def staff_activity_select():
+    """Fact rows aggregated per (month, bar, staff), in STAFF_ACTIVITY_COLUMNS order."""
+    month_start = cast(func.date_trunc("month", FactRow.day), Date)
+    return (
+        select(
+            month_start,
+            FactRow.bar,
+            FactRow.staff_id,
+            func.max(FactRow.agent_id_derived),
+            func.min(FactRow.day),
+            func.max(FactRow.day),
+            func.count(FactRow.day.distinct()),
+            func.coalesce(func.sum(FactRow.profit), 0),
+            func.coalesce(func.sum(FactRow.drinks), 0),
+            func.count().filter(FactRow.agent_mismatch.is_(True)),
+        )
+        .group_by(month_start, FactRow.bar, FactRow.staff_id)
+    )
+
+
+STAFF_ACTIVITY_COLUMNS = [
+    "month_start", "bar", "staff_id", "agent_id_derived",
+    "first_seen", "last_seen", "days", "profit_sum", "drinks_sum", "mismatch_rows",
+]
+
+
+async def refresh_rollups(db: AsyncSession, days: Iterable[date]) -> None:
+    """Recompute rollups, staff sketches and monthly staff activity for the given days."""
+    days = sorted(set(days))
+    if not days:
+        return
+    # Pending ORM changes must be visible to the INSERT ... SELECT
+    await db.flush()
+    for model, columns, query in (
+        (DailyRollup, DAILY_ROLLUP_COLUMNS, daily_rollup_select()),
+        (DailyStaffSketch, DAILY_SKETCH_COLUMNS, daily_sketch_select()),
+    ):
+        await db.execute(delete(model).where(model.date.in_(days)))
+        await db.execute(
+            insert(model).from_select(columns, query.where(FactRow.day.in_(days)))
+        )
+
+    months = sorted({day.replace(day=1) for day in days})
+    await db.execute(delete(StaffMonthlyActivity).where(StaffMonthlyActivity.month_start.in_(months)))
+    await db.execute(
+        insert(StaffMonthlyActivity).from_select(
+            STAFF_ACTIVITY_COLUMNS,
+            staff_activity_select().where(or_(*(
+                and_(FactRow.date >= month, FactRow.date < _next_month(month))
+                for month in months
+            ))),
+        )
+    )
@@ -0,0 +1,146 @@
+"""
+Streaming export of fact rows as CSV, NDJSON or Parquet.
+
+Rows are read through a server-side cursor in fixed-size partitions and
+encoded partition by partition, so memory stays flat whatever the size of
+the export.
+"""
+import csv
+import io
+import json
+from collections.abc import AsyncIterator
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Boolean, DateTime, Integer, Numeric, select
+from sqlalchemy.sql import Select
+
+from app.core.db import async_session_factory
+from app.models import FactRow
+
+# Exported columns, same as the /rows payload
+EXPORT_COLUMNS = [
+    "id", "business_key", "source_year", "bar", "date", "agent_label", "staff_id",
+    "position", "salary", "start_time", "late", "drinks", "off", "cut_late",
+    "cut_drink", "cut_other", "total", "sale", "profit", "contract",
+    "staff_num_prefix", "agent_id_derived", "agent_mismatch",
+]
+
+PARTITION_SIZE = 5000
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def export_select() -> Select:
+    """Core select of the exported columns, in stable order."""
+    table = FactRow.__table__
+    return select(*(table.c[name] for name in EXPORT_COLUMNS)).order_by(table.c.date, table.c.id)
+
+
+async def _partitions(query: Select) -> AsyncIterator[list[Any]]:
+    """Yield lists of rows from a server-side cursor."""
+    async with async_session_factory() as session:
+        result = await session.stream(query.execution_options(yield_per=PARTITION_SIZE))
+        async for partition in result.partitions():
+            yield partition
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+async def stream_csv(query: Select) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    async for partition in _partitions(query):
+        writer.writerows(partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def stream_ndjson(query: Select) -> AsyncIterator[str]:
+    async for partition in _partitions(query):
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=_json_default) + "\n"
+            for row in partition
+        )
+
+
+def _arrow_type(column) -> pa.DataType:
+    if isinstance(column.type, Numeric):
+        return pa.decimal128(column.type.precision, column.type.scale)
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    return pa.string()
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back chunk by chunk."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_parquet(query: Select) -> AsyncIterator[bytes]:
+    table = FactRow.__table__
+    schema = pa.schema([(name, _arrow_type(table.c[name])) for name in EXPORT_COLUMNS])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for partition in _partitions(query):
+            columns = list(zip(*partition))
+            writer.write_table(pa.table(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+STREAMERS = {
+    "csv": stream_csv,
+    "ndjson": stream_ndjson,
+    "parquet": stream_parquet,
+}
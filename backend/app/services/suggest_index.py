@@ -0,0 +1,160 @@
+"""
+In-process autocomplete index for staff, agents and bars.
+
+Built once per data version from the precomputed staff activity and daily
+rollups, then queried without touching the database: every lookup key is
+kept in a sorted list and prefix matches are a bisect range. Keys are the
+lowercased staff_id ("046 - nick"), its number without leading zeros
+("46"), each nickname token, agent keys and labels, and bar names. A query
+equal to a staff number ranks that staff first. Multi-word queries ("nick j")
+match on their first word and keep the entries whose label has a token
+starting with each of the other words.
+
+While a newer data version is being indexed, the previous index keeps
+answering.
+"""
+import asyncio
+import heapq
+import logging
+import re
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Iterable
+
+from sqlalchemy import func, select
+
+from app.core.db import async_session_factory
+from app.models import DailyRollup, StaffMonthlyActivity
+from app.services.data_version import current_fact_version
+
+# Match quality, best first (EXACT_NUMBER is assigned at query time)
+EXACT_NUMBER, EXACT_PREFIX, NUMBER_PREFIX, TOKEN_PREFIX = 0, 1, 2, 3
+
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+logger = logging.getLogger(__name__)
+
+_index: "SuggestIndex | None" = None
+_build_lock = asyncio.Lock()
+_build_task: asyncio.Task | None = None
+
+
+@dataclass(frozen=True)
+class Suggestion:
+    kind: str  # "staff", "agent" or "bar"
+    value: str  # Filter value accepted by /rows: staff_search, "BAR|ID" agent key or bar
+    label: str
+    weight: int  # Days worked (staff) or rows (agents, bars); higher ranks first
+
+
+def _staff_keys(staff_id: str) -> Iterable[tuple[str, int]]:
+    """(key, match quality) pairs a staff_id is found under."""
+    lowered = staff_id.lower()
+    yield lowered, EXACT_PREFIX
+    number, _, nickname = lowered.partition(" - ")
+    if number.isdigit():
+        yield str(int(number)), NUMBER_PREFIX
+    for token in _TOKEN_SPLIT.split(nickname if nickname else lowered):
+        if token:
+            yield token, TOKEN_PREFIX
+
+
+class SuggestIndex:
+    """Sorted (key, quality, entry) lists for one data version."""
+
+    def __init__(self, version: str, suggestions: list[Suggestion]):
+        self.version = version
+        self.suggestions = suggestions
+        entries: list[tuple[str, int, int]] = []
+        for i, suggestion in enumerate(suggestions):
+            if suggestion.kind == "staff":
+                keys = _staff_keys(suggestion.value)
+            else:
+                keys = [(suggestion.value.lower(), EXACT_PREFIX), (suggestion.label.lower(), TOKEN_PREFIX)]
+            entries.extend((key, quality, i) for key, quality in set(keys))
+        entries.sort()
+        self.keys = [key for key, _, _ in entries]
+        self.entries = [(quality, i) for _, quality, i in entries]
+
+    def _matches(self, prefix: str, kinds: set[str] | None) -> dict[int, int]:
+        """Best match quality per suggestion with a key starting with `prefix`."""
+        best: dict[int, int] = {}
+        start = bisect_left(self.keys, prefix)
+        for position in range(start, bisect_left(self.keys, prefix + "\uffff", start)):
+            quality, i = self.entries[position]
+            if kinds is None or self.suggestions[i].kind in kinds:
+                if quality == NUMBER_PREFIX and self.keys[position] == prefix:
+                    quality = EXACT_NUMBER
+                best[i] = min(quality, best.get(i, quality))
+        return best
+
+    def suggest(self, query: str, limit: int = 10, kinds: Iterable[str] | None = None) -> list[Suggestion]:
+        """Best `limit` suggestions whose keys start with `query` (case-insensitive)."""
+        query = query.strip().lower()
+        if not query:
+            return []
+        kinds = set(kinds) if kinds else None
+        best = self._matches(query, kinds)
+        words = [word for word in _TOKEN_SPLIT.split(query) if word]
+        if len(words) > 1:
+            for i, quality in self._matches(words[0], kinds).items():
+                tokens = _TOKEN_SPLIT.split(self.suggestions[i].label.lower())
+                if all(any(token.startswith(word) for token in tokens) for word in words[1:]):
+                    best[i] = min(quality, best.get(i, quality))
+        ranked = heapq.nsmallest(
+            limit,
+            best.items(),
+            key=lambda item: (item[1], -self.suggestions[item[0]].weight, self.suggestions[item[0]].value),
+        )
+        return [self.suggestions[i] for i, _ in ranked]
+
+
+async def build_index(version: str) -> SuggestIndex:
+    """Read distinct staff, agents and bars with their weights."""
+    activity = StaffMonthlyActivity
+    async with async_session_factory() as session:
+        staff = (await session.execute(
+            select(activity.staff_id, func.sum(activity.days)).group_by(activity.staff_id)
+        )).all()
+        agents = (await session.execute(
+            select(DailyRollup.bar, DailyRollup.agent_id_derived, func.sum(DailyRollup.rows))
+            .group_by(DailyRollup.bar, DailyRollup.agent_id_derived)
+        )).all()
+
+    suggestions = [Suggestion("staff", staff_id, staff_id, int(days)) for staff_id, days in staff]
+    bar_rows: dict[str, int] = {}
+    for bar, agent_id, rows in agents:
+        bar_rows[bar] = bar_rows.get(bar, 0) + int(rows)
+        if agent_id is not None:
+            suggestions.append(Suggestion("agent", f"{bar}|{agent_id}", f"Agent {agent_id} ({bar})", int(rows)))
+    suggestions.extend(Suggestion("bar", bar, bar, rows) for bar, rows in bar_rows.items())
+    return SuggestIndex(version, suggestions)
+
+
+async def _rebuild(version: str) -> SuggestIndex:
+    global _index
+    async with _build_lock:
+        if _index is None or _index.version != version:
+            _index = await build_index(version)
+    return _index
+
+
+def _log_build_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Suggest index rebuild failed", exc_info=task.exception())
+
+
+async def get_suggest_index() -> SuggestIndex:
+    """
+    Index for the current data version. The first call builds it; after a
+    version change the stale index is returned while a rebuild runs.
+    """
+    global _build_task
+    version = await current_fact_version()
+    index = _index
+    if index is None:
+        return await _rebuild(version)
+    if index.version != version and (_build_task is None or _build_task.done()):
+        _build_task = asyncio.get_running_loop().create_task(_rebuild(version))
+        _build_task.add_done_callback(_log_build_failure)
+    return index
@@ -0,0 +1,104 @@
+"""
+Benchmark the in-process analytics engine against the SQL path.
+
+Runs /rows/kpis, leaderboard and payroll computations both ways on the
+current database, checks that the results are identical and prints the
+median time of each.
+
+Usage: python bench_analytics_engine.py [iterations]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from app.api.filters import RowFilters
+from app.api.routes.analytics import _compute_payroll, _month_bounds, get_leaderboard
+from app.api.routes.rows import _fetch_kpis
+from app.core.config import get_settings
+from app.core.db import async_session_factory
+from app.services.analytics_engine import get_engine
+
+
+def row_filters(**values) -> RowFilters:
+    params = dict(bar=None, year=None, month=None, contract=None, agent=None,
+                  start_date=None, end_date=None, staff_search=None)
+    params.update(values)
+    return RowFilters(**params)
+
+
+def leaderboard_key(response):
+    """Entries without rank, in a tie-independent order."""
+    return sorted(
+        (e.id, e.bar, e.agent_id, round(e.profit, 2), round(e.drinks, 2), e.days)
+        for e in response.entries
+    )
+
+
+def payroll_key(agents):
+    return sorted((a.model_dump() for a in agents), key=lambda a: a["agent_id"])
+
+
+def scenarios():
+    today = date.today()
+    month_start, month_end = _month_bounds(today.year, today.month)
+    previous_start, previous_end = _month_bounds(
+        *(((today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)))
+    )
+    year = today.year
+    return [
+        ("kpis: all rows", lambda db: _fetch_kpis(db, row_filters()), lambda r: r),
+        ("kpis: bar + year", lambda db: _fetch_kpis(db, row_filters(bar=["SHARK"], year=[year])), lambda r: r),
+        ("kpis: staff search", lambda db: _fetch_kpis(db, row_filters(staff_search="09")), lambda r: r),
+        ("kpis: date range + agent", lambda db: _fetch_kpis(db, row_filters(
+            start_date=(today - timedelta(days=90)).isoformat(), end_date=today.isoformat(),
+            agent=["SHARK|1", "MANDARIN|NULL"])), lambda r: r),
+        ("leaderboard: staff, all", lambda db: get_leaderboard(
+            type="STAFF", mode="ALL", sort_by="PROFIT", search=None, bar=None, year=None, month=None, db=db),
+         leaderboard_key),
+        ("leaderboard: agents, year", lambda db: get_leaderboard(
+            type="AGENT", mode="TOP10", sort_by="PROFIT", search=None, bar=None, year=year, month=None, db=db),
+         leaderboard_key),
+        ("payroll: current month", lambda db: _compute_payroll(db, month_start, month_end, None), payroll_key),
+        ("payroll: previous month, one bar", lambda db: _compute_payroll(db, previous_start, previous_end, "SHARK"),
+         payroll_key),
+    ]
+
+
+async def timed(fn, iterations: int):
+    timings, result = [], None
+    for _ in range(iterations):
+        async with async_session_factory() as db:
+            start = time.perf_counter()
+            result = await fn(db)
+            timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings)
+
+
+async def main(iterations: int):
+    settings = get_settings()
+
+    settings.analytics_engine_enabled = True
+    start = time.perf_counter()
+    engine = await get_engine()
+    print(f"Engine load: {engine.size} rows in {(time.perf_counter() - start) * 1000:.0f} ms\n")
+
+    print(f"{'scenario':36} {'sql ms':>9} {'engine ms':>10} {'speedup':>8}  same")
+    mismatches = 0
+    for name, fn, key in scenarios():
+        settings.analytics_engine_enabled = False
+        sql_result, sql_ms = await timed(fn, iterations)
+        settings.analytics_engine_enabled = True
+        engine_result, engine_ms = await timed(fn, iterations)
+        same = key(sql_result) == key(engine_result)
+        mismatches += not same
+        print(f"{name:36} {sql_ms:9.2f} {engine_ms:10.2f} {sql_ms / engine_ms:7.1f}x  {'yes' if same else 'NO'}")
+
+    if mismatches:
+        print(f"\n{mismatches} scenario(s) differ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
@@ -0,0 +1,92 @@
+"""
+Benchmark substring staff search (staff_search / leaderboard search).
+
+For a few search terms, times the /rows/kpis aggregate and a first page
+of rows on the SQL path, with the planner free to use the pg_trgm index
+and with bitmap/index scans disabled (the sequential scan the index
+replaces), and prints the plan chosen for each.
+
+Usage: python bench_staff_search.py [iterations] [term ...]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from sqlalchemy import func, select, text
+
+from app.api.filters import RowFilters
+from app.api.routes.rows import _fetch_kpis
+from app.core.config import get_settings
+from app.core.db import async_session_factory
+from app.models import FactRow
+
+DEFAULT_TERMS = ["NICK12", "123 - NICK", "ICK4", "09", "nobody"]
+SEQUENTIAL = ["SET LOCAL enable_bitmapscan = off", "SET LOCAL enable_indexscan = off"]
+
+
+def row_filters(term: str) -> RowFilters:
+    return RowFilters(bar=None, year=None, month=None, contract=None, agent=None,
+                      start_date=None, end_date=None, staff_search=term)
+
+
+def page_query(filters: RowFilters):
+    return filters.apply(select(FactRow)).order_by(FactRow.date.desc(), FactRow.id.desc()).limit(100)
+
+
+async def timed(fn, iterations: int, settings: list[str]) -> float:
+    timings = []
+    for _ in range(iterations):
+        async with async_session_factory() as db:
+            # asyncpg reuses prepared statements, whose cached plans ignore SET LOCAL
+            await db.execute(text("DISCARD PLANS"))
+            for statement in settings:
+                await db.execute(text(statement))
+            start = time.perf_counter()
+            await fn(db)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def plan(filters: RowFilters) -> str:
+    """Scan nodes of the KPI aggregate's plan."""
+    query = filters.apply(select(func.count(), func.sum(FactRow.profit)).select_from(FactRow))
+    async with async_session_factory() as db:
+        compiled = query.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+        lines = (await db.execute(text(f"EXPLAIN {compiled}"))).scalars().all()
+    return ", ".join(
+        line.strip().lstrip("-> ").split("  ")[0]
+        for line in lines
+        if "Scan" in line
+    )
+
+
+async def main(iterations: int, terms: list[str]):
+    # Measure the database, not the in-process engine
+    get_settings().analytics_engine_enabled = False
+    async with async_session_factory() as db:
+        rows = (await db.execute(select(func.count()).select_from(FactRow))).scalar()
+        indexed = (await db.execute(text(
+            "SELECT count(*) FROM pg_indexes WHERE indexname = 'ix_fact_rows_staff_id_trgm'"
+        ))).scalar()
+    print(f"{rows} fact rows, trigram index {'present' if indexed else 'MISSING'}\n")
+
+    print(f"{'term':14} {'matches':>8} {'kpis ms':>8} {'seq ms':>8} {'page ms':>8} {'seq ms':>8}  plan")
+    for term in terms:
+        filters = row_filters(term)
+        kpis = lambda db: _fetch_kpis(db, filters)
+        page = lambda db: db.execute(page_query(filters))
+        async with async_session_factory() as db:
+            matches = (await _fetch_kpis(db, filters)).total_rows
+        print(
+            f"{term:14} {matches:8} "
+            f"{await timed(kpis, iterations, []):8.2f} {await timed(kpis, iterations, SEQUENTIAL):8.2f} "
+            f"{await timed(page, iterations, []):8.2f} {await timed(page, iterations, SEQUENTIAL):8.2f}  "
+            f"{await plan(filters)}"
+        )
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    iterations = int(args.pop(0)) if args and args[0].isdigit() else 5
+    asyncio.run(main(iterations, args or DEFAULT_TERMS))
@@ -0,0 +1,113 @@
+"""
+Check that filtered fact_rows queries use the composite indexes.
+
+Builds the /rows page and KPI aggregate queries through RowFilters for
+selective filters (bar + one week, agent + one week, year + month, one
+staff + one month, one day), runs EXPLAIN on each and asserts that
+fact_rows is read through one of the expected indexes, never by a
+sequential scan. Filter values are taken from the data, so run it against
+a populated and analyzed database. Exits non-zero when a plan regresses.
+
+Usage: python check_fact_indexes.py
+"""
+import asyncio
+import json
+import sys
+from datetime import timedelta
+
+from sqlalchemy import func, select, text
+
+from app.api.filters import RowFilters
+from app.core.db import async_session_factory
+from app.models import FactRow
+
+PAGE_SIZE = 100
+# Pages are ordered by date: walking this index backwards is also a valid plan
+PAGE_ORDER_INDEX = "ix_fact_rows_date_id"
+
+
+def row_filters(**values) -> RowFilters:
+    defaults = dict(bar=None, year=None, month=None, contract=None, agent=None,
+                    start_date=None, end_date=None, staff_search=None)
+    return RowFilters(**{**defaults, **values})
+
+
+def page_query(query):
+    return query.order_by(FactRow.date.desc(), FactRow.id.desc()).limit(PAGE_SIZE)
+
+
+def kpis_query(query):
+    return query.with_only_columns(
+        func.count(FactRow.id), func.sum(FactRow.profit), func.count(func.distinct(FactRow.staff_key)),
+    )
+
+
+def fact_scans(plan: dict) -> list[tuple[str, str | None]]:
+    """(node type, index name) of every plan node reading fact_rows."""
+    scans = []
+    if plan.get("Relation Name") == "fact_rows" or plan.get("Index Name", "").startswith("ix_fact_rows_"):
+        scans.append((plan["Node Type"], plan.get("Index Name")))
+    for child in plan.get("Plans", []):
+        scans.extend(fact_scans(child))
+    return scans
+
+
+async def explain(db, query) -> list[tuple[str, str | None]]:
+    compiled = query.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    result = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))).scalar()
+    plan = result if isinstance(result, list) else json.loads(result)
+    return fact_scans(plan[0]["Plan"])
+
+
+async def main() -> int:
+    async with async_session_factory() as db:
+        sample = (await db.execute(
+            select(FactRow.bar, FactRow.agent_id_derived, FactRow.staff_id, FactRow.date,
+                   FactRow.source_year, FactRow.month)
+            .where(FactRow.agent_id_derived.is_not(None))
+            .order_by(FactRow.date.desc())
+            .limit(1)
+        )).one_or_none()
+        if sample is None:
+            print("fact_rows is empty: nothing to check")
+            return 1
+        bar, agent_id, staff_id, day, source_year, month = sample
+        day = day.date()
+        week = dict(start_date=str(day - timedelta(days=6)), end_date=str(day))
+
+        base = select(FactRow)
+        cases = [
+            ("bar + week", row_filters(bar=[bar], **week).apply(base),
+             {"ix_fact_rows_bar_date", "ix_fact_rows_bar_agent_date"}),
+            ("agent + week", row_filters(agent=[f"{bar}|{agent_id}"], **week).apply(base),
+             {"ix_fact_rows_bar_agent_date"}),
+            ("year + month", row_filters(year=[source_year], month=[month]).apply(base),
+             {"ix_fact_rows_source_year_month"}),
+            ("staff + month", row_filters(start_date=str(day - timedelta(days=30)), end_date=str(day))
+             .apply(base).where(FactRow.staff_id == staff_id),
+             {"ix_fact_rows_staff_date"}),
+            ("one day", row_filters(start_date=str(day), end_date=str(day)).apply(base),
+             {PAGE_ORDER_INDEX, "ix_fact_rows_bar_date"}),
+        ]
+
+        failures = 0
+        print(f"{'case':14} {'query':6} {'ok':3} scans")
+        for name, query, expected in cases:
+            for kind, shaped, allowed in (
+                ("page", page_query(query), expected | {PAGE_ORDER_INDEX}),
+                ("kpis", kpis_query(query), expected),
+            ):
+                scans = await explain(db, shaped)
+                indexes = {index for _, index in scans if index}
+                ok = bool(indexes & allowed) and all(node != "Seq Scan" for node, _ in scans)
+                failures += not ok
+                described = ", ".join(f"{node} {index or ''}".strip() for node, index in scans)
+                print(f"{name:14} {kind:6} {'yes' if ok else 'NO':3} {described}")
+
+    if failures:
+        print(f"\n{failures} plan(s) did not use the expected fact_rows index")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))